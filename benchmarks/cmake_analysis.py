@@ -0,0 +1,179 @@
+"""
+Benchmark of the CMake analysis layer over the CMake trees of the commits in data/dataset.
+
+    python -m benchmarks.cmake_analysis [--repeat N] [--limit N] [--update-golden]
+
+The corpus is built once into storage_paths["cmake-corpus"]: the new commit of every dataset entry
+is checked out (with submodules) and only its CMakeLists.txt/*.cmake files are kept. Per corpus
+tree the parse and the CMakeAnalyzer queries are timed on a fresh analyzer (p50/p95 over all trees
+and repetitions), the peak memory of a tree is measured with tracemalloc (in this process, a
+process pool parse is not included) and the results are compared against the golden output
+GOLDEN_PATH (--update-golden rewrites it). Exits with 1 if a result differs or there is no golden
+output yet.
+"""
+import argparse, json, logging, math, re, shutil, subprocess, sys, tempfile, time, tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+from tqdm import tqdm
+from src.cmake.analyzer import CMakeAnalyzer
+from src.cmake.parser import CMakeParser
+from src.config.constants import DATA_DIR, STORAGE_PATHS, CMAKE_PRUNE_DIRS
+from src.gh.clone import GitHandler
+
+DATASET_DIR = DATA_DIR / "dataset"
+GOLDEN_PATH = Path(__file__).with_name("cmake_analysis_golden.json")
+COMPLETE = ".corpus-complete" # marker of a fully copied corpus tree
+CMAKE_FILE = re.compile(r"CMakeLists\.txt$|.*\.cmake$")
+
+QUERIES: dict[str, Callable[[CMakeAnalyzer], Any]] = {
+    "has_testing": lambda analyzer: analyzer.has_testing(),
+    "find_cmake_test_flags": lambda analyzer: analyzer.extract_build_testing_flag(),
+    "find_dependencies": lambda analyzer: analyzer.get_dependencies(),
+    "find_cmake_minimum_required": lambda analyzer: analyzer.parser.find_cmake_minimum_required(),
+}
+
+def dataset_entries(limit: int = 0) -> list[tuple[str, str]]:
+    """(repository, new sha) of the dataset commits."""
+    entries: set[tuple[str, str]] = set()
+    for path in sorted(DATASET_DIR.glob("*.json")):
+        with open(path) as f:
+            data = json.load(f)
+        entries.add((data["metadata"]["repository_name"], data["commit_info"]["new_sha"]))
+    return sorted(entries)[:limit] if limit else sorted(entries)
+
+def corpus_name(repo_id: str, sha: str) -> str:
+    return f"{repo_id.replace('/', '_')}_{sha}"
+
+def build_corpus(corpus: Path, entries: list[tuple[str, str]]) -> list[Path]:
+    """Corpus trees of <entries>, missing trees are checked out first (one clone per repository)."""
+    missing: dict[str, list[str]] = {}
+    for repo_id, sha in entries:
+        if not (corpus / corpus_name(repo_id, sha) / COMPLETE).exists():
+            missing.setdefault(repo_id, []).append(sha)
+
+    git = GitHandler()
+    for repo_id, shas in tqdm(missing.items(), desc="Building corpus", disable=not missing):
+        clone = Path(tempfile.mkdtemp(prefix="cmake-corpus-"))
+        try:
+            for i, sha in enumerate(shas):
+                if i == 0:
+                    checked_out = git.clone_repo(repo_id, clone, sha=sha, chmod=False)
+                else:
+                    checked_out = all(subprocess.run(cmd, cwd=clone, capture_output=True).returncode == 0 for cmd in (
+                        ["git", "checkout", "-f", sha],
+                        ["git", "submodule", "update", "--init", "--recursive", "--force"],
+                    ))
+                if not checked_out:
+                    logging.warning(f"Skipping {repo_id}@{sha}, checkout failed")
+                    continue
+                _copy_cmake_files(clone, corpus / corpus_name(repo_id, sha))
+        finally:
+            shutil.rmtree(clone, onerror=git._on_rm_error)
+
+    return [corpus / corpus_name(repo_id, sha) for repo_id, sha in entries if (corpus / corpus_name(repo_id, sha) / COMPLETE).exists()]
+
+def _copy_cmake_files(src: Path, dest: Path) -> None:
+    if dest.exists():
+        shutil.rmtree(dest)
+    for path in CMakeParser(src).find_files(pattern=CMAKE_FILE, prune=CMAKE_PRUNE_DIRS, prune_build=True):
+        target = dest / path.relative_to(src)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(path, target)
+    dest.mkdir(parents=True, exist_ok=True)
+    (dest / COMPLETE).touch()
+
+def normalize(value: Any, root: Path) -> Any:
+    """JSON form of a query result, paths relative to <root>."""
+    if isinstance(value, dict):
+        return {str(k): normalize(v, root) for k, v in value.items()}
+    if isinstance(value, (set, frozenset)):
+        return sorted(normalize(v, root) for v in value)
+    if isinstance(value, (list, tuple)):
+        return [normalize(v, root) for v in value]
+    if isinstance(value, (str, Path)):
+        return str(value).replace(f"{root}/", "")
+    return value
+
+def analyze(root: Path) -> tuple[dict[str, float], dict[str, Any]]:
+    """Times (parse, every query, total) and normalized results of the queries on a fresh analyzer."""
+    times: dict[str, float] = {}
+    results: dict[str, Any] = {}
+    analyzer = CMakeAnalyzer(root)
+    start = time.perf_counter()
+    analyzer.parser.cmake_function_calls
+    times["parse"] = time.perf_counter() - start
+    for name, query in QUERIES.items():
+        query_start = time.perf_counter()
+        results[name] = normalize(query(analyzer), root)
+        times[name] = time.perf_counter() - query_start
+    times["total"] = time.perf_counter() - start
+    return times, results
+
+def peak_memory(root: Path) -> int:
+    """Peak of the memory allocated while analyzing <root> (bytes)."""
+    tracemalloc.start()
+    try:
+        analyze(root)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=0, help="only the first N dataset commits")
+    parser.add_argument("--update-golden", action="store_true")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    trees = build_corpus(Path(STORAGE_PATHS["cmake-corpus"]), dataset_entries(args.limit))
+    if not trees:
+        sys.exit("Empty corpus")
+    print(f"{len(trees)} CMake trees, {args.repeat} repetitions")
+
+    logging.disable(logging.WARNING)
+    samples: dict[str, list[float]] = {}
+    results: dict[str, dict[str, Any]] = {}
+    for _ in range(args.repeat):
+        for root in trees:
+            times, results[root.name] = analyze(root)
+            for name, seconds in times.items():
+                samples.setdefault(name, []).append(seconds)
+    peaks = [peak_memory(root) / 2**20 for root in trees]
+    logging.disable(logging.NOTSET)
+
+    print(f"{'':<28} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for name, values in samples.items():
+        print(f"{name:<28} {percentile(values, 50) * 1e3:>9.2f} {percentile(values, 95) * 1e3:>9.2f} {max(values) * 1e3:>9.2f}")
+    print(f"{'peak memory (MiB)':<28} {percentile(peaks, 50):>9.2f} {percentile(peaks, 95):>9.2f} {max(peaks):>9.2f}")
+
+    if args.update_golden:
+        with open(GOLDEN_PATH, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Golden output of {len(results)} trees written to {GOLDEN_PATH}")
+        return
+    if not GOLDEN_PATH.exists():
+        sys.exit(f"No golden output at {GOLDEN_PATH}, create it with --update-golden")
+
+    with open(GOLDEN_PATH) as f:
+        golden: dict[str, dict[str, Any]] = json.load(f)
+    differing = 0
+    for name, result in results.items():
+        if name not in golden:
+            print(f"  {name}: not in the golden output")
+            continue
+        queries = [query for query in QUERIES if golden[name].get(query) != result[query]]
+        if queries:
+            differing += 1
+            print(f"  {name}: {', '.join(queries)} differ from the golden output")
+    print(f"{len(results) - differing}/{len(results)} trees match the golden output")
+    if differing:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark and equivalence check of the CMake parser engines: the tokenizer (src/cmake/tokenizer.py)
+against cmakeast, over the CMake trees of a corpus.
+
+    python -m benchmarks.cmake_tokenizer [ROOT ...] [--repeat N]
+
+Every ROOT is analyzed like a repository (without ROOT: the cloned repositories in
+storage_paths["clones"]). Reported are the parse times per engine, the files cmakeast fails on,
+the files whose function calls differ and the roots whose analyzer results differ.
+"""
+import argparse, logging, re, statistics, sys, time
+from pathlib import Path
+from typing import Any
+from src.cmake.parser import CMakeParser, _parse_cmake_file
+from src.config.constants import STORAGE_PATHS, CMAKE_PRUNE_DIRS
+
+ENGINES = ("cmakeast", "tokenizer")
+CMAKE_FILE = re.compile(r"CMakeLists\.txt$|.*\.cmake$")
+
+def analyze(root: Path, engine: str) -> dict[str, Any]:
+    """Results of the CMakeAnalyzer queries on <root>."""
+    parser = CMakeParser(root, engine=engine)
+    results: dict[str, Any] = {
+        "enable_testing": parser.find_enable_testing(),
+        "add_tests": parser.find_add_tests(),
+        "discover_tests": parser.find_discover_tests(),
+        "can_list_tests": parser.can_list_tests(),
+        "list_test_arg": sorted(parser.list_test_arg),
+        "enable_testing_path": sorted(map(str, parser.enable_testing_path)),
+        "test_flags": parser.find_cmake_test_flags(),
+        "dependencies": sorted(parser.find_dependencies()),
+    }
+    if parser.has_root_cmake():
+        results["cmake_minimum_required"] = parser.find_cmake_minimum_required()
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("roots", nargs="*", type=Path)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    clones = Path(STORAGE_PATHS["clones"])
+    roots = args.roots or sorted(path for path in (clones.iterdir() if clones.is_dir() else []) if path.is_dir())
+    files = [cf for root in roots for cf in CMakeParser(root).find_files(pattern=CMAKE_FILE, prune=CMAKE_PRUNE_DIRS, prune_build=True)]
+    if not files:
+        sys.exit("No CMake files found")
+    print(f"{len(roots)} roots, {len(files)} CMake files, {args.repeat} repetitions")
+
+    times: dict[str, list[float]] = {engine: [] for engine in ENGINES}
+    parsed: dict[str, list] = {}
+    for engine in ENGINES:
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            parsed[engine] = [_parse_cmake_file(cf, engine) for cf in files]
+            times[engine].append(time.perf_counter() - start)
+        print(f"{engine:<10} min {min(times[engine]):.3f}s  median {statistics.median(times[engine]):.3f}s")
+    print(f"speedup {statistics.median(times['cmakeast']) / statistics.median(times['tokenizer']):.1f}x")
+
+    failed = [cf for cf, (_, error) in zip(files, parsed["cmakeast"]) if error]
+    different = [
+        cf for cf, (calls, error), (own_calls, _) in zip(files, parsed["cmakeast"], parsed["tokenizer"])
+        if not error and [(c.name, [w.contents for w in c.arguments]) for c in calls] != [(c.name, [w.contents for w in c.arguments]) for c in own_calls]
+    ]
+    print(f"cmakeast failed on {len(failed)} files, function calls differ in {len(different)} files")
+    for cf in different:
+        print(f"  calls differ: {cf}")
+
+    equivalent = 0
+    for root in roots:
+        expected, results = analyze(root, "cmakeast"), analyze(root, "tokenizer")
+        differing = [query for query in results if expected.get(query) != results[query]]
+        if differing:
+            print(f"  results differ: {root} {differing}")
+        else:
+            equivalent += 1
+    print(f"analyzer results identical for {equivalent}/{len(roots)} roots")
+
+if __name__ == "__main__":
+    main()
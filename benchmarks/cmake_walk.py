@@ -0,0 +1,74 @@
+"""
+Benchmark of the CMake AST traversal: the former dir()/getattr reflection walk against the
+child-field table walk of CMakeParser._walk_ast, over the parsed CMake files of a corpus.
+
+    python -m benchmarks.cmake_walk [DIR ...] [--repeat N]
+
+Without DIR the cloned repositories (storage_paths["clones"]) are used.
+"""
+import argparse, statistics, sys, time
+from pathlib import Path
+from typing import Callable, Generator
+from cmakeast.printer import ast
+from src.cmake.parser import CMakeParser
+from src.config.constants import STORAGE_PATHS
+
+def _check_cmakeast_class(node) -> bool:
+    return hasattr(node, "__class__") and node.__class__.__module__.startswith("cmakeast")
+
+def reflection_walk(node) -> Generator:
+    """The former CMakeParser._walk_ast."""
+    if isinstance(node, list):
+        for item in node:
+            yield from reflection_walk(item)
+    elif _check_cmakeast_class(node):
+        yield node
+        for attr_name in dir(node):
+            if attr_name.startswith("_"):
+                continue
+            try:
+                value = getattr(node, attr_name)
+                if isinstance(value, (list,)) or _check_cmakeast_class(value):
+                    yield from reflection_walk(value)
+            except Exception:
+                continue
+
+def measure(walk: Callable[[list], Generator], trees: list[list], repeat: int) -> tuple[list[float], list[list]]:
+    times: list[float] = []
+    calls: list[list] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        calls = [[node for node in walk(tree) if isinstance(node, ast.FunctionCall)] for tree in trees]
+        times.append(time.perf_counter() - start)
+    return times, calls
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dirs", nargs="*", type=Path)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    files = [
+        path for root in (args.dirs or [Path(STORAGE_PATHS["clones"])])
+        for path in sorted(root.rglob("*")) if path.name == "CMakeLists.txt" or path.suffix == ".cmake"
+    ]
+    trees: list[list] = []
+    start = time.perf_counter()
+    for path in files:
+        try:
+            trees.append(ast.parse(path.read_text(errors="ignore")).statements)
+        except Exception:
+            continue
+    if not trees:
+        sys.exit("No parsable CMake files found")
+    print(f"{len(trees)} CMake files parsed in {time.perf_counter() - start:.2f}s, {args.repeat} repetitions")
+
+    baseline, expected = measure(reflection_walk, trees, args.repeat)
+    table, calls = measure(CMakeParser(Path("."))._walk_ast, trees, args.repeat)
+    for name, times in (("dir() reflection", baseline), ("child-field table", table)):
+        print(f"{name:<18} min {min(times):.3f}s  median {statistics.median(times):.3f}s")
+    print(f"speedup {statistics.median(baseline) / statistics.median(table):.1f}x")
+    print(f"{sum(map(len, calls))} function calls, identical order: {expected == calls}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Micro-benchmark of the configure/build log scanning: one re.findall/re.search per pattern over
+the whole output (the former PackageHandler/FlagResolver) against the single-pass LogScanner.
+
+    python -m benchmarks.log_scanner [LOG ...] [--repeat N]
+
+Without LOG the captured container logs (storage_paths["docker-logs"]) are used.
+"""
+import argparse, re, statistics, sys, time
+from pathlib import Path
+from typing import Callable
+from src.cmake.patterns import CONFIG_ERROR_PATTERNS, BUILD_ERROR_PATTERNS, FLAGS_ERROR_PATTERNS
+from src.cmake.scanner import ERROR_SCANNER
+from src.config.constants import STORAGE_PATHS
+
+def findall_scan(text: str) -> dict[str, set[str]]:
+    config = "CMake Error" + text.split("CMake Error", 1)[1] if "CMake Error" in text else text
+    found: dict[str, set[str]] = {"config": set(), "build": set(), "flags": set()}
+    for pattern in CONFIG_ERROR_PATTERNS:
+        # a (header, item) pattern as one pattern spanning lines, as before
+        found["config"].update(re.findall(pattern if isinstance(pattern, str) else "".join(pattern), config))
+    for pattern in BUILD_ERROR_PATTERNS:
+        found["build"].update(re.findall(pattern, text))
+    for i, flag in enumerate(FLAGS_ERROR_PATTERNS):
+        if re.search(flag["regex"], text, re.I):
+            found["flags"].add(str(i))
+    return found
+
+def scanner_scan(text: str) -> dict[str, set[str]]:
+    found: dict[str, set[str]] = {"config": set(), "build": set(), "flags": set()}
+    start = max(0, text.find("CMake Error"))
+    found["config"].update(m.group(1) for _, m in ERROR_SCANNER.scan(text, ("config",), start))
+    found["build"].update(m.group(1) for _, m in ERROR_SCANNER.scan(text, ("build",)))
+    found["flags"].update(str(i) for (_, i), _ in ERROR_SCANNER.scan(text, ("flags",)))
+    return found
+
+def measure(scan: Callable[[str], dict[str, set[str]]], texts: list[str], repeat: int) -> tuple[list[float], list[dict[str, set[str]]]]:
+    times: list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [scan(text) for text in texts]
+        times.append(time.perf_counter() - start)
+    return times, results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("logs", nargs="*", type=Path)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    paths = args.logs or sorted(Path(STORAGE_PATHS["docker-logs"]).rglob("*.log"))
+    if not paths:
+        sys.exit(f"No logs given and none found in {STORAGE_PATHS['docker-logs']}")
+    texts = [path.read_text(errors="ignore") for path in paths]
+    size = sum(len(text) for text in texts) / 1e6
+    print(f"{len(texts)} logs, {size:.1f} MB, {args.repeat} repetitions")
+
+    baseline, expected = measure(findall_scan, texts, args.repeat)
+    scanner, results = measure(scanner_scan, texts, args.repeat)
+    for name, times in (("findall per pattern", baseline), ("LogScanner", scanner)):
+        print(f"{name:<20} min {min(times):.3f}s  median {statistics.median(times):.3f}s  {size / min(times):.1f} MB/s")
+    print(f"speedup {statistics.median(baseline) / statistics.median(scanner):.1f}x")
+
+    for path, old, new in zip(paths, expected, results):
+        for group in old:
+            if old[group] != new[group]:
+                print(f"{path} {group}: only findall {sorted(old[group] - new[group])}, only LogScanner {sorted(new[group] - old[group])}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import json, logging, os, sqlite3, threading, time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional
+from src.config.config import Config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dependencies (
+    name TEXT NOT NULL,
+    release TEXT NOT NULL DEFAULT '',
+    mapping TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (name, release)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+UPSERT = """
+INSERT INTO dependencies (name, release, mapping, updated) VALUES (?, ?, ?, ?)
+ON CONFLICT (name, release) DO UPDATE SET mapping = excluded.mapping, updated = excluded.updated
+"""
+
+class DependencyStore:
+    """
+    Mapping of CMake dependency names to apt/vcpkg packages and configure flags, keyed by
+    (dependency, Ubuntu release). Entries with the release '' apply to every release.
+
+    The mapping lives in a SQLite database (storage_paths["cmake-dep-db"]) that is shared by all
+    processes: lookups are indexed and cached per process, new entries are upserted one transaction
+    at a time. On first use the former cache/cmake-dep.json is imported with the release ''.
+    """
+    _shared: dict[str, "DependencyStore"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, path: Path, json_path: Optional[Path] = None):
+        self.path = Path(path)
+        self.json_path = Path(json_path) if json_path else None
+        self.lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._entries: dict[tuple[str, str], dict[str, Any]] = {}
+
+    @classmethod
+    def shared(cls, config: Config) -> "DependencyStore":
+        """The store of this process (opened lazily on the first lookup)."""
+        path = Path(config.storage_paths["cmake-dep-db"])
+        with cls._shared_lock:
+            store = cls._shared.get(str(path))
+            if store is None:
+                store = cls._shared[str(path)] = cls(path, config.storage_paths.get("cmake-dep"))
+            return store
+
+    def get(self, name: str, release: str = "") -> dict[str, Any]:
+        """Mapping of <name> for <release> (or for every release), empty if unknown."""
+        key = (name, release)
+        with self.lock:
+            if key in self._entries:
+                return self._entries[key]
+            rows = self._connection().execute(
+                "SELECT release, mapping FROM dependencies WHERE name = ? AND release IN (?, '')", (name, release)
+            ).fetchall()
+            if not rows:
+                return {}
+            _, mapping = max(rows, key=lambda row: row[0] == release)
+            entry = self._entries[key] = json.loads(mapping)
+            return entry
+
+    def upsert(self, entries: dict[str, dict[str, Any]], release: str = "") -> None:
+        """Adds or replaces the mappings of <entries> for <release> in one transaction."""
+        if not entries:
+            return
+        now = time.time()
+        rows = [(name, release, json.dumps(mapping), now) for name, mapping in entries.items()]
+        with self.lock:
+            conn = self._connection()
+            with self._transaction(conn):
+                conn.executemany(UPSERT, rows)
+            # lookups of other releases may have fallen back to a replaced entry
+            self._entries = {key: value for key, value in self._entries.items() if key[0] not in entries}
+            for name, mapping in entries.items():
+                self._entries[(name, release)] = mapping
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self._connection().execute("SELECT COUNT(*) FROM dependencies").fetchone()[0]
+
+    def _connection(self) -> sqlite3.Connection:
+        # connections are not shared with forked workers
+        if self._conn is None or self._pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=60000")
+            conn.executescript(SCHEMA)
+            self._conn, self._pid, self._entries = conn, os.getpid(), {}
+            self._migrate(conn)
+        return self._conn
+
+    @contextmanager
+    def _transaction(self, conn: sqlite3.Connection) -> Iterator[None]:
+        # BEGIN IMMEDIATE takes the write lock up front, concurrent writers wait (busy_timeout)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except Exception as e:
+            conn.execute("ROLLBACK")
+            logging.error(f"Updating the dependency store {self.path} failed: {e}")
+            raise
+        conn.execute("COMMIT")
+
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        """Imports the JSON mapping once, entries already in the store are kept."""
+        mapping: dict[str, dict[str, Any]] = {}
+        with self._transaction(conn):
+            if conn.execute("SELECT 1 FROM meta WHERE key = 'migrated'").fetchone():
+                return
+            if self.json_path and self.json_path.exists():
+                try:
+                    with open(self.json_path) as f:
+                        mapping = json.load(f)
+                except json.JSONDecodeError as e:
+                    logging.warning(f"Skipping migration of {self.json_path} ({e})")
+            now = time.time()
+            conn.executemany(
+                "INSERT OR IGNORE INTO dependencies (name, release, mapping, updated) VALUES (?, '', ?, ?)",
+                [(name, json.dumps(entry), now) for name, entry in mapping.items() if isinstance(entry, dict)]
+            )
+            conn.execute("INSERT INTO meta (key, value) VALUES ('migrated', ?)", (str(self.json_path),))
+        if mapping:
+            logging.info(f"Migrated {len(mapping)} dependencies from {self.json_path} to {self.path}")
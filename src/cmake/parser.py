@@ -1,11 +1,98 @@
-import os, logging, re
+import os, logging, re, bisect
+from concurrent.futures import ProcessPoolExecutor
 from cmakeast.printer import ast
 from typing import Optional, Generator
 from pathlib import Path
+from src.config.constants import CMAKE_PRUNE_DIRS, CMAKE_PARALLEL_PARSE, CMAKE_PARSER_ENGINE
+from src.cmake import tokenizer
+from src.utils.cpu import get_available_cpus
+
+# max. parse processes of this process, None: one per available CPU (see limit_parse_workers)
+_parse_workers: Optional[int] = None
+
+def limit_parse_workers(workers: int) -> None:
+    """
+    Caps the parse processes of this process, e.g. a commit-tester worker at its job's cpus_per_job:
+    its process is not pinned, so a parse over all host CPUs would run on the cores of other jobs' timed tests.
+    """
+    global _parse_workers
+    _parse_workers = max(1, workers)
+
+# fields of the cmakeast nodes that hold statements, in the (alphabetical) order they are walked
+AST_CHILD_FIELDS: dict[type, tuple[str, ...]] = {
+    ast.ToplevelBody: ("statements",),
+    ast.GenericBody: ("statements",),
+    ast.FunctionDefinition: ("body", "footer", "header"),
+    ast.MacroDefinition: ("body", "footer", "header"),
+    ast.ForeachStatement: ("body", "footer", "header"),
+    ast.WhileStatement: ("body", "footer", "header"),
+    ast.IfBlock: ("else_statement", "elseif_statements", "footer", "if_statement"),
+    ast.IfStatement: ("body", "header"),
+    ast.ElseIfStatement: ("body", "header"),
+    ast.ElseStatement: ("body", "header"),
+    ast.Word: (),
+}
+
+class FunctionCallIndex:
+    """
+    Function calls of CMake files indexed by name and by (name, argument), built once per parse.
+    A query only touches the calls of the matching names (and arguments).
+    """
+    def __init__(self, calls: list[tuple[ast.FunctionCall, Path]]):
+        self.calls: list[tuple[ast.FunctionCall, Path]] = [(call, Path(cf)) for call, cf in calls]
+        self.arguments: list[list[str]] = [] # stripped contents of the arguments of every call
+        self.by_name: dict[str, list[int]] = {}
+        self.by_argument: dict[tuple[str, str], list[int]] = {}
+        for i, (call, _) in enumerate(self.calls):
+            arguments = [argument.contents.strip() for argument in call.arguments if hasattr(argument, "contents")]
+            self.arguments.append(arguments)
+            self.by_name.setdefault(call.name, []).append(i)
+            for argument in set(arguments):
+                self.by_argument.setdefault((call.name, argument), []).append(i)
+        self.names = sorted(self.by_name)
+        self.reversed_names = sorted(name[::-1] for name in self.by_name)
+
+    def find(self, name: str = "", _args: list[str] = [], starts: str = "", ends: str = "") -> list[tuple[ast.FunctionCall, Path]]:
+        """Calls named <name>, starting with <starts> or ending with <ends> that have all <_args>, in file order."""
+        names: set[str] = set()
+        if name in self.by_name:
+            names.add(name)
+        if starts:
+            names.update(self._prefixed(self.names, starts))
+        if ends:
+            names.update(reversed_name[::-1] for reversed_name in self._prefixed(self.reversed_names, ends[::-1]))
+
+        if _args:
+            wanted = set(_args)
+            candidates = {i for n in names for argument in wanted for i in self.by_argument.get((n, argument), [])}
+            found = [i for i in candidates if sum(argument in wanted for argument in self.arguments[i]) >= len(_args)]
+        else:
+            found = [i for n in names for i in self.by_name[n]]
+        return [self.calls[i] for i in sorted(found)]
+
+    @staticmethod
+    def _prefixed(names: list[str], prefix: str) -> list[str]:
+        start = bisect.bisect_left(names, prefix)
+        end = start
+        while end < len(names) and names[end].startswith(prefix):
+            end += 1
+        return names[start:end]
+
+def _parse_cmake_file(cf: Path, engine: str = CMAKE_PARSER_ENGINE) -> tuple[list[ast.FunctionCall], str]:
+    """Function calls of <cf> and the parse error ('' if none), runs in the parser processes."""
+    with open(cf, 'r', errors='ignore') as file:
+        content = file.read()
+    try:
+        statements = (ast.parse(content) if engine == "cmakeast" else tokenizer.parse(content)).statements
+    except Exception as e:
+        return [], str(e) or type(e).__name__
+    return list(CMakeParser._walk_ast(statements)), ""
 
 class CMakeParser:
-    def __init__(self, root: Path):
+    def __init__(self, root: Path, prune: set[str] = CMAKE_PRUNE_DIRS, engine: str = CMAKE_PARSER_ENGINE):
         self.root = root
+        self.prune = prune
+        self.engine = engine
 
         self.enable_testing_path: list[Path] = []
         self.add_test_path: list[Path] = []
@@ -15,11 +102,12 @@ class CMakeParser:
 
         self._cmake_files: Optional[list[Path]] = None
         self._cmake_function_calls: Optional[list[tuple[ast.FunctionCall, Path]]] = None
+        self._cmake_function_index: Optional[FunctionCallIndex] = None
 
     @property
     def cmake_files(self) -> list[Path]:
         if self._cmake_files is None:
-            self._cmake_files = self.find_files(search="CMakeLists.txt")
+            self._cmake_files = self.find_files(search="CMakeLists.txt", prune=self.prune, prune_build=True)
         return self._cmake_files
 
     @property
@@ -28,16 +116,44 @@ class CMakeParser:
             self._cmake_function_calls = self._find_all_function_calls(self.cmake_files)
         return self._cmake_function_calls
 
+    @property
+    def cmake_function_index(self) -> FunctionCallIndex:
+        if self._cmake_function_index is None:
+            self._cmake_function_index = FunctionCallIndex(self.cmake_function_calls)
+        return self._cmake_function_index
+
     def has_root_cmake(self) -> bool:
         return (self.root / "CMakeLists.txt").exists()
 
-    def find_files(self, search: str = "", pattern: Optional[re.Pattern] = None) -> list[Path]:
-        """Search all files 'search' from root."""
+    def find_files(self, search: str = "", pattern: Optional[re.Pattern] = None, prune: set[str] = set(), prune_build: bool = False) -> list[Path]:
+        """
+        Search all files 'search' from root (in os.walk order). Directories named in <prune> and with
+        <prune_build> build trees (directories with a CMakeCache.txt) are not searched.
+        """
         found_files: list[Path] = []
-        for root, _, files in os.walk(self.root):
-            for file in files: 
-                if file == search or (pattern and pattern.match(file)):
-                    found_files.append(Path(root, file))
+        stack = [str(self.root)]
+        while stack:
+            root = stack.pop()
+            try:
+                with os.scandir(root) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            if prune_build and any(entry.name == "CMakeCache.txt" for entry in entries):
+                continue
+
+            dirs: list[str] = []
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if not is_dir:
+                    if entry.name == search or (pattern and pattern.match(entry.name)):
+                        found_files.append(Path(root, entry.name))
+                elif entry.name not in prune and not entry.is_symlink():
+                    dirs.append(entry.path)
+            stack.extend(reversed(dirs))
         return found_files
     
     def find_cmake_minimum_required(self) -> str:
@@ -366,65 +482,55 @@ class CMakeParser:
         logging.debug(f"Found possible dependencies: {packages}")
         return packages
 
-    def _check_cmakeast_class(self, node) -> bool:
+    @staticmethod
+    def _check_cmakeast_class(node) -> bool:
         return hasattr(node, "__class__") and node.__class__.__module__.startswith("cmakeast")
 
-    def _walk_ast(self, node) -> Generator[ast.FunctionCall, None, None]:
+    @staticmethod
+    def _walk_ast(node) -> Generator[ast.FunctionCall, None, None]:
         """
-        Walks the CMake AST generated by the CMakeAst library
+        Walks the CMake AST generated by the CMakeAst library and yields its function calls (depth first)
         """
-        if isinstance(node, list):
-            for item in node:
-                yield from self._walk_ast(item)
-        elif self._check_cmakeast_class(node):
-            yield node
-            for attr_name in dir(node):
-                if attr_name.startswith("_"):
-                    continue
-                try:
-                    value = getattr(node, attr_name)
-                    if isinstance(value, (list,)) or self._check_cmakeast_class(value):
-                        yield from self._walk_ast(value)
-                except Exception:
-                    continue
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                stack.extend(reversed(node))
+            elif isinstance(node, ast.FunctionCall):
+                yield node
+            elif node is not None:
+                fields = AST_CHILD_FIELDS.get(type(node))
+                if fields is None:
+                    if not CMakeParser._check_cmakeast_class(node):
+                        continue
+                    # node type unknown to the table
+                    fields = AST_CHILD_FIELDS[type(node)] = tuple(sorted(getattr(node, "_fields", ())))
+                stack.extend(getattr(node, field) for field in reversed(fields))
 
     def _find_function_calls(self, name: str = "", _args: list[str] = [], starts: str = "", ends: str = "", fcalls: list[tuple[ast.FunctionCall, Path]] = []) -> list[tuple[ast.FunctionCall, Path]]:
         """
         Find a specific function call <name> with specific <_args> arguments or arguments that <starts> or <ends> with a specific string according to CMakeAst library
         """
-        calls: list[tuple[ast.FunctionCall, Path]] = []
-        if not fcalls:
-            fcalls = self.cmake_function_calls
-        for statement, cf in fcalls:
-            if (name and statement.name == name) or (ends and statement.name.endswith(ends)) or (starts and statement.name.startswith(starts)):
-                arguments: list = statement.arguments
-                if not _args:
-                    calls.append((statement, Path(cf)))
-                count = 0
-                for argument in arguments:
-                    if (hasattr(argument, "contents") and argument.contents.strip() in _args):
-                        count += 1
-                if count >= len(_args):
-                    calls.append((statement, Path(cf)))   
-        return calls
+        index = FunctionCallIndex(fcalls) if fcalls else self.cmake_function_index
+        return index.find(name=name, _args=_args, starts=starts, ends=ends)
     
     def _find_all_function_calls(self, files: list[Path]) -> list[tuple[ast.FunctionCall, Path]]:
         """
         Finds all function calls in CMake according to CMakeAst library
         """
+        cpus = len(get_available_cpus()) if _parse_workers is None else _parse_workers
+        workers = min(cpus, len(files) // CMAKE_PARALLEL_PARSE + 1)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                parsed = list(executor.map(_parse_cmake_file, files, [self.engine] * len(files), chunksize=16))
+        else:
+            parsed = [_parse_cmake_file(cf, self.engine) for cf in files]
+
         calls: list[tuple[ast.FunctionCall, Path]] = []
-        for cf in files:
-            with open(cf, 'r', errors='ignore') as file:
-                content = file.read()
-            try:
-                statements = ast.parse(content).statements
-            except Exception as e:
-                logging.warning(f"{cf} has an error: {e}")
-                continue
-            cmake_statements = self._walk_ast(statements)
-            for statement in cmake_statements:
-                if isinstance(statement, ast.FunctionCall):
-                    calls.append((statement, cf))
+        for cf, (statements, error) in zip(files, parsed):
+            if error:
+                logging.warning(f"{cf} has an error: {error}")
+            calls += [(statement, cf) for statement in statements]
         return calls
     
     def _valid_name(self, name: str) -> bool:
@@ -1,3 +1,5 @@
+# patterns match within a line, a (header, item) pair matches <item> after <header> and on every
+# following line up to the first (non-blank) line without <item>
 CONFIG_ERROR_PATTERNS = [
     r"No package '([a-zA-Z0-9_\-\+\.]+)' found",
     r"Could NOT find ([A-Za-z0-9_\-\+\.]+)",
@@ -26,11 +28,20 @@ CONFIG_ERROR_PATTERNS = [
     r"  ([A-Za-z0-9_+\-]+) library not found",
     r"None of the required '([A-Za-z0-9_+-]+)",
     r"  ([A-Za-z0-9_+-]+)\s+library missing",
-    r'references the file\s+"([^"]+)"',
+    (r'references the file', r'\s*"([^"]+)"'),
     r'([A-Z]+)_INCLUDE_DIR',
     r'-D([A-Z]+)_INCLUDE_PATH',
     r' component\s+"([^"]+)"',
-    r"The following required packages were not found:\s*(?:\n\s*-\s*([^\s]+))+"
+    (r"The following required packages were not found:", r"\s+-\s+([^\s-]\S*)")
+]
+
+# failures of the Ninja generator itself, after which the configuration is retried with Unix Makefiles
+GENERATOR_ERROR_PATTERNS = [
+    r"CMAKE_MAKE_PROGRAM is not set",
+    r"unable to find a build program corresponding to \"Ninja\"",
+    r"Does not match the generator used previously",
+    r"Ninja generator does not support",
+    r"ninja: error: (?:loading|build\.ninja)",
 ]
 
 BUILD_ERROR_PATTERNS = [
@@ -1,13 +1,18 @@
-import logging, subprocess, tempfile, json, io, tarfile
+import logging, subprocess, tempfile, json, io, tarfile, re
 from pathlib import Path
 from src.cmake.analyzer import CMakeAnalyzer
 from src.cmake.resolver import DependencyResolver
+from src.cmake.scanner import ERROR_SCANNER
 from src.utils.parser import *
 from typing import Optional, Union
 from src.core.docker.manager import DockerManager
+from src.core.docker.ccache import stats_delta, add_stats
+from src.core.docker.depcache import DependencyImageCache
+from src.core.docker.pool import commit_changes
 from src.config.config import Config
+from src.config.constants import CMAKE_RELOCATABLE_FLAGS
 from src.utils.permission import check_and_fix_path_permissions
-from src.utils.image_handling import image
+from src.utils.image_handling import image, image_exists, delete_image, register_image, image_size, save_image
 
 class CMakeProcess:
     """Class configures, builds, tests, and clones commits."""
@@ -34,6 +39,10 @@ class CMakeProcess:
 
         self.container = None
         self.docker_image: str = ""
+        self.base_image: str = ""
+        self.dep_image: Optional[dict] = None
+        self.repo_id: str = ""
+        self.cpuset_cpus: str = ""
         self.config_stdout: str = ""
         self.config_stderr: str = ""
         self.build_stdout: str = ""
@@ -52,6 +61,11 @@ class CMakeProcess:
         self.cmake_build_output: list[str] = []
         self.ctest_output: list[str] = []
         self.per_test_times: dict[str, dict[str, list[float]]] = {}
+        # resource usage of the container per repetition (aligned with test_time), see src/core/docker/measure.py
+        self.ccache_stats: dict = {}
+        self.generator: Optional[str] = None # '' is cmake's default generator (Unix Makefiles)
+        self.cmake_version: Optional[tuple[int, ...]] = None
+        self.run_stats: list[dict[str, float]] = [{} for _ in range(self.config.testing.warmup + self.config.testing.commit_test_times)]
         self.framework: str = ""
         self.unit_tests_map: dict[str, dict[str, str]] = {}
 
@@ -64,36 +78,90 @@ class CMakeProcess:
 
     def set_docker(self, docker_image: str, new: bool) -> None:
         self.docker = DockerManager(self.config, self.root.parent, docker_image, self.config.testing.docker_test_dir, new)
+        self.docker.base_image = self.base_image or docker_image
 
-    def start_docker_image(self, container_name: str, new: bool = True, cpuset_cpus: str = "") -> None:
+    def start_docker_image(self, container_name: str, new: bool = True, cpuset_cpus: str = "", repo_id: str = "") -> None:
         if not self.docker_image:
             # if no docker_image set then it takes a predefined cmake version in CMakeLists.txt mapped to a Dockerfile base
-            self.docker_image = self.analyzer.get_docker()
+            self.docker_image = self.base_image = self.analyzer.get_docker()
+            if new and repo_id:
+                self._use_dependency_image(repo_id)
+        self.repo_id = repo_id
+        self.cpuset_cpus = cpuset_cpus
         logging.info(f"Started Docker Image: {self.docker_image}")
         self.set_docker(self.docker_image, new)
         self.docker.start_docker_container(container_name, cpuset_cpus)
         self.container = self.docker.container
-
-        # copy the cloned commits into the docker container docker_test_dir
-        copy_cmd = ["cp", "-r", "/workspace", self.config.testing.docker_test_dir]
-        exit_code, stdout, stderr, _ = self.docker.run_command_in_docker(copy_cmd, self.root, check=False)
-        if exit_code != 0:
-            logging.error(f"Copy files failed with exit code {exit_code}: {' '.join(map(str, copy_cmd))}")
-            if stdout: logging.info(f"stdout: {stdout}")
-            if stderr: logging.warning(f"stderr: {stderr}")
+        if repo_id:
+            self.docker.enable_ccache(repo_id)
+
+        # stream the cloned commit into the docker container docker_test_dir/workspace
+        dest = self.to_container_path(self.root)
+        if not self.docker.copy_to_container(self.root, dest, self.config.testing.copy_exclude):
+            logging.error(f"Copy files failed: {self.root} -> {dest}")
+
+    def _use_dependency_image(self, repo_id: str) -> None:
+        """Starts from the cached dependency image of an earlier commit of the repository (if any)."""
+        entry = DependencyImageCache(self.config).lookup(repo_id, self.base_image)
+        if not entry:
+            return
+        self.dep_image = entry
+        self.docker_image = entry["image"]
+        # the dependencies are already installed, but they are still part of the saved build commands
+        self.resolver.install_cmds = DependencyResolver.collapse(entry["install_cmds"])
+
+    def cache_dependencies(self, other_install_cmds: list[list[str]] = []) -> Optional[str]:
+        """
+        Caches the base image with the dependencies installed for this commit for later commits.
+        Returns the dependency image if it contains everything installed in the container
+        (also <other_install_cmds> of the other commit of the pair), None otherwise.
+        """
+        if not self.repo_id or not self.base_image:
+            return None
+        if self.dep_image and self.resolver.install_cmds == DependencyResolver.collapse(self.dep_image["install_cmds"]):
+            image_name = self.dep_image["image"]
         else:
-            logging.info(f"Files copied into docker: {' '.join(map(str, copy_cmd))}")
-            if stdout: logging.info(f"stdout: {stdout}")
+            image_name = DependencyImageCache(self.config).store(self.repo_id, self.base_image, self.resolver.install_cmds, self.cpuset_cpus)
+        if not self.resolver.covers(other_install_cmds):
+            return None
+        return image_name
+
+    def _restart_from_base_image(self) -> bool:
+        """Replaces the container started from a cached dependency image with a fresh base image container."""
+        if not self.dep_image:
+            return False
+        logging.warning(f"[{self.repo_id}] Configuration with cached dependency image {self.docker_image} failed, falling back to {self.base_image}")
+        DependencyImageCache(self.config).discard(self.repo_id, self.docker_image)
+        repo_id, container_name = self.repo_id, self.docker.container_name
+        self.docker.stop_container(repo_id)
+
+        self.dep_image = None
+        self.docker_image = self.base_image
+        self.resolver = DependencyResolver(self.config)
+        self.other_flags = {"append": [], "remove": []}
+        self.other_cmds = []
+        self.test_flags = set()
+        self.build_commands = []
+        self.cmake_config_output = []
+        self.cmake_build_output = []
+        self.start_docker_image(container_name, True, self.cpuset_cpus, repo_id)
+        return self.container is not None
 
 
     def save_docker_image(
             self, repo_id: str, sha: str, 
             new_build_cmd: list[str], old_build_cmd: list[str], 
             new_test_cmd: list[str], old_test_cmd: list[str],
-            results_json: dict) -> None:
+            results_json: dict, dep_image: Optional[str] = None) -> None:
         """
+        Saved docker image layers:
+        | base image (cpp20, cpp22, cpp24)
+        | dependency image <dep_image> -- installed packages, shared by the images of a repository
+        | /test_workspace -- files of /workspace/new identical to /workspace/old are hardlinked,
+                             build intermediates (testing.prune_patterns) are removed
+
         Saved docker image structure:
-        | /workspace -- mount folder
+        | /workspace -- working directory
         | /test_workspace 
             | /workspace
                 | /old -- old commit => OK
@@ -112,24 +180,18 @@ class CMakeProcess:
         image_name = image(repo_id, sha)
         container_id = self.container.id if self.container and self.container.id else "test"
         
-        inspect = subprocess.run(
-            ["docker", "image", "inspect", image_name],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
-        )
-
-        if inspect.returncode == 0:
+        if image_exists(other=image_name):
             logging.info(f"Removing existing image: {image_name}")
-            rm = subprocess.run(
-                ["docker", "rmi", "-f", image_name],
-                capture_output=True,
-                text=True
-            )
-            if rm.returncode != 0:
-                logging.error(f"Failed to remove old image {image_name}: {rm.stderr}")
+            delete_image(other=image_name)
 
+        results_json["image_info"] = self._prune_build(new_test_cmd + old_test_cmd)
         self.copy_log_to_container(container_id, results_json)
+        self.docker.copy_logs_to_container()
         self.docker.copy_commands_to_container(self.root, new_build_cmd, old_build_cmd, new_test_cmd, old_test_cmd)
+        docker_test_dir = self.config.testing.docker_test_dir
+        results_json["image_info"]["dedupe_files"], results_json["image_info"]["dedupe_size"] = self.docker.dedupe_trees(
+            f"{docker_test_dir}/workspace/old", f"{docker_test_dir}/workspace/new", Path(self.build_path).name
+        )
 
         clean_cmd = [
             ["apt-get", "autoremove", "-y"], 
@@ -147,14 +209,36 @@ class CMakeProcess:
                 if stdout: logging.info(f"stdout: {stdout}")
                 if stderr: logging.warning(f"stderr: {stderr}")
             
-        result = subprocess.run(["docker", "commit", container_id, image_name], capture_output=True, text=True)
-        if result.returncode != 0:
-            logging.error(f"docker commit failed: {result.stderr}")
+        # a container started from the dependency image already shares its layers
+        layered = bool(dep_image) and self.container is not None and self.container.attrs["Config"]["Image"] != dep_image
+        if not (layered and self.docker.commit_layer(dep_image or "", image_name)):
+            result = subprocess.run(["docker", "commit", *commit_changes(), container_id, image_name], capture_output=True, text=True)
+            if result.returncode != 0:
+                logging.error(f"docker commit failed: {result.stderr}")
+            else:
+                register_image(image_name)
+
+        results_json["image_info"]["image_size"] = image_size(image_name)
+        # the same image without pruning, to make the saved registry/disk bandwidth visible
+        results_json["image_info"]["unpruned_image_size"] = results_json["image_info"]["image_size"] + results_json["image_info"]["pruned_size"]
+        logging.info(f"Image {image_name}: {results_json['image_info']}")
         
         if self.config.tar:
-            result = subprocess.run(["docker", "save", image_name, "-o", f"{image_name}.tar"], capture_output=True, text=True)
-            if result.returncode != 0:
-                logging.error(f"docker save failed: {result.stderr}")
+            save_image(image_name, Path(image_name), self.config.transfer.tar_compression, self.config.transfer.zstd_level)
+
+    def _prune_build(self, test_cmds: list[str]) -> dict:
+        """Removes the build intermediates of both builds, the files used by the test commands are kept."""
+        docker_test_dir = self.config.testing.docker_test_dir
+        workspace = f"{docker_test_dir}/workspace"
+        build_dirs = [f"{workspace}/{tree}/build" for tree in ("new", "old")]
+        info = {"workspace_size": self.docker.disk_usage(workspace), "pruned_files": 0, "pruned_size": 0}
+        if self.config.testing.prune_build:
+            keep = sorted({arg for cmd in test_cmds for arg in cmd.split() if arg.startswith(workspace)})
+            info["pruned_files"], info["pruned_size"] = self.docker.prune(
+                build_dirs, self.config.testing.prune_patterns, self.config.testing.prune_exclude, keep
+            )
+        info["pruned_workspace_size"] = self.docker.disk_usage(workspace)
+        return info
 
     def copy_log_to_container(self, container_id: str, results_json: dict) -> None:
         log_config: str = f"Configuration output:\n" + '\n'.join(self.cmake_config_output) + "\n"
@@ -240,7 +324,7 @@ class CMakeProcess:
             apt-get update
             <package installs>
             cmake -S /test_workspace/workspace/old -B /test_workspace/workspace/old/build -DCMAKE_BUILD_TYPE=Debug -DCMAKE_EXPORT_COMPILE_COMMANDS=ON -DBUILD_TESTING=ON
-            cmake --build /test_workspace/workspace/old/build -- -j 1
+            cmake --build /test_workspace/workspace/old/build --parallel 1
         """
         for cmd in self.build_commands[:-2]:
             logging.info(" ".join(map(str, cmd)))
@@ -288,8 +372,73 @@ class CMakeProcess:
         return self._configure()
 
     def build(self) -> bool:
-        return self._configure_with_retries() #and self._build()
+        if self._configure_with_retries(): #and self._build()
+            return True
+        return self._restart_from_base_image() and self._configure_with_retries()
     
+    def build_from(self, base: "CMakeProcess") -> bool:
+        """
+        Builds this (old) commit incrementally in the build tree of <base> (the new commit in the same container):
+        the new tree is stashed, the sources of this commit are synced into it and it is rebuilt with the
+        configure and build commands of <base>, so only the changed translation units recompile with identical flags.
+        The rebuilt tree is then moved to this commit's path and the new tree is restored.
+        Returns False (with the new tree restored) if this commit has to be built separately.
+        """
+        if not self.container or len(base.build_commands) < 2:
+            return False
+        base_dir, own_dir = base.to_container_path(base.root), self.to_container_path(self.root)
+        if len(base_dir) != len(own_dir):
+            # the paths in the build tree are rewritten in place
+            return False
+
+        stash = f"{base_dir}.stash"
+        configure_cmd, build_cmd = base.build_commands[-2], base.build_commands[-1]
+        exit_code, _, stderr, _ = self.docker.run_command_in_docker(["cp", "-a", base_dir, stash], self.root, check=False)
+        if exit_code != 0:
+            logging.warning(f"Stashing {base_dir} failed: {stderr}")
+            self.docker.run_command_in_docker(["rm", "-rf", stash], self.root, check=False)
+            return False
+
+        built = False
+        changed = self.docker.sync_tree(own_dir, base_dir, Path(base.build_path).name)
+        if changed is not None:
+            logging.info(f"Rebuilding {base_dir} with {changed} changed files of {own_dir}")
+            ccache_before = self.docker.ccache_stats()
+            built = all(
+                self.docker.run_command_in_docker(cmd, self.root, check=False)[0] == 0
+                for cmd in (configure_cmd, build_cmd)
+            )
+            if ccache_before:
+                add_stats(self.ccache_stats, stats_delta(ccache_before, self.docker.ccache_stats()))
+
+        if built:
+            # binaries with the absolute path of the build tree in their RPATH/RUNPATH would load the new commit's libraries once moved
+            pinned = self.docker.absolute_rpaths(base_dir, str(base.build_path))
+            if pinned is None or pinned:
+                logging.warning(f"Build tree of {base_dir} is not relocatable ({', '.join(pinned[:5]) if pinned else 'readelf failed'})")
+                built = False
+
+        if not built:
+            logging.warning(f"Incremental build of {own_dir} in {base_dir} failed, building it separately")
+            self.docker.run_command_in_docker(["rm", "-rf", base_dir], self.root, check=False)
+            self.docker.run_command_in_docker(["mv", stash, base_dir], self.root, check=False)
+            return False
+
+        self.docker.run_command_in_docker(["rm", "-rf", own_dir], self.root, check=False)
+        self.docker.run_command_in_docker(["mv", base_dir, own_dir], self.root, check=False)
+        self.docker.relocate_tree(base_dir, own_dir, str(self.build_path))
+        self.docker.run_command_in_docker(["mv", stash, base_dir], self.root, check=False)
+
+        self.generator = base.generator
+        self.test_flags = set(base.test_flags)
+        self.other_flags = {key: list(flags) for key, flags in base.other_flags.items()}
+        self.resolver.install_cmds = [list(cmd) for cmd in base.resolver.install_cmds]
+        self.build_commands = self.resolver.install_cmds + [
+            [arg.replace(base_dir, own_dir) for arg in cmd] for cmd in (configure_cmd, build_cmd)
+        ]
+        logging.info(f"Old commit built incrementally from the build tree of {base_dir}")
+        return True
+
     def test(self, cmd: list[str], has_test_framework: bool) -> bool:
         return self._ctest(cmd, has_test_framework)
 
@@ -309,6 +458,15 @@ class CMakeProcess:
             return False
 
         parsed = False
+        self.resolver.release = self.analyzer.get_ubuntu_version()
+        if self.config.testing.preresolve_dependencies:
+            # statically found dependencies are installed up front, the loop only handles what the analysis missed
+            unresolv, oflags = self.resolver.preinstall(self.analyzer.get_dependencies(), self.container)
+            unresolved_dependencies |= unresolv
+            self.test_flags |= oflags
+            # dependencies unknown to the cache still go through the failure-driven resolution (LLM)
+            parsed = not unresolv
+
         for attempt in range(max_retries):
             logging.info(f"[Attempt {attempt+1}/{max_retries}] Configuring project at {self.root}")
 
@@ -319,6 +477,9 @@ class CMakeProcess:
                 self.build_commands.reverse() # 1. build, 2. configure -> reversed
                 self.build_commands = self.resolver.install_cmds + self.build_commands
                 return True
+
+            if self._fallback_generator():
+                continue
             
             missing_dependencies = self.resolver.package_handler.get_missing_dependencies(
                 self.config_stdout, 
@@ -393,7 +554,6 @@ class CMakeProcess:
             'cmake',
             '-S', self.to_container_path(self.root), 
             '-B', str(self.build_path).replace("\\", "/"), 
-            #'-G', 'Ninja',
 
             #'-DVCPKG_MANIFEST_MODE=ON',
             #'-DVCPKG_MANIFEST_DIR=' + self.root,  # vcpkg.json location
@@ -414,13 +574,24 @@ class CMakeProcess:
             #'-DCMAKE_C_FLAGS=-fprofile-instr-generate -fcoverage-mapping -O0 -g',
             #'-DCMAKE_CXX_FLAGS=-fprofile-instr-generate -fcoverage-mapping -O0 -g',
             #'-DCMAKE_EXE_LINKER_FLAGS=-fprofile-instr-generate',
-            #'-DCMAKE_C_COMPILER_LAUNCHER=ccache',
-            #'-DCMAKE_CXX_COMPILER_LAUNCHER=ccache',
 
             #'-DCMAKE_VERBOSE_MAKEFILE=ON',
             #'-DCMAKE_FIND_DEBUG_MODE=ON',
         ]
 
+        if self.generator is None:
+            self.generator = self._select_generator()
+        if self.generator:
+            cmd += ['-G', self.generator]
+
+        if self.config.testing.incremental_build:
+            # build_from moves the build tree of the old commit
+            cmd += CMAKE_RELOCATABLE_FLAGS
+
+        if self.docker.ccache:
+            cmd.append('-DCMAKE_C_COMPILER_LAUNCHER=ccache')
+            cmd.append('-DCMAKE_CXX_COMPILER_LAUNCHER=ccache')
+
         for flag in self.flags:
             if 'disable' in flag.lower():
                 cmd.append(f'-D{flag}=OFF')
@@ -485,15 +656,66 @@ class CMakeProcess:
     
 ############### BUILDING ###############
 
+    def _select_generator(self) -> str:
+        """testing.generator if its build tool is available in the container, otherwise cmake's default."""
+        generator = self.config.testing.generator
+        if generator != "Ninja":
+            return generator
+        exit_code, _, _, _ = self.docker.run_command_in_docker(["ninja", "--version"], self.root, check=False, log=False)
+        if exit_code != 0:
+            logging.info(f"ninja is not available in {self.docker_image}, using Unix Makefiles")
+            return ""
+        return generator
+
+    def _fallback_generator(self) -> bool:
+        """
+        Switches from Ninja to Unix Makefiles after a configuration that failed on a generator error,
+        False if already on Makefiles or the failure is not the generator's (e.g. a missing package).
+        """
+        if not self.generator:
+            return False
+        output = "\n".join((self.config_stdout, self.config_stderr, self.build_stdout, self.build_stderr))
+        if next(ERROR_SCANNER.scan(output, ("generator",)), None) is None:
+            return False
+        logging.warning(f"Configuration with the {self.generator} generator failed, falling back to Unix Makefiles")
+        self.generator = ""
+        return True
+
+    def generator_name(self) -> str:
+        """Generator of the configure command in build_commands."""
+        for command in self.build_commands:
+            args = [s for c in command for s in c.split(" ")]
+            if args[:1] != ["cmake"] or "--build" in args:
+                continue
+            for i, arg in enumerate(args):
+                if arg == "-G" and i + 1 < len(args):
+                    return args[i + 1]
+                if arg.startswith("-G") and len(arg) > 2:
+                    return arg[2:]
+        return "Unix Makefiles"
+
+    def _parallel_args(self, jobs: int) -> list[str]:
+        """Build parallelism for any generator, the native '-j' of Makefiles and Ninja before CMake 3.12."""
+        if self.cmake_version is None:
+            _, stdout, _, _ = self.docker.run_command_in_docker(["cmake", "--version"], self.root, check=False, log=False)
+            m = re.search(r"cmake version (\d+)\.(\d+)", stdout)
+            self.cmake_version = (int(m.group(1)), int(m.group(2))) if m else (0, 0)
+        if self.cmake_version >= (3, 12):
+            return ['--parallel', str(jobs)]
+        return ['--', '-j', str(jobs)]
+
     def _build(self) -> bool:
-        cmd = ['cmake', '--build', str(self.build_path).replace("\\", "/"), '--']
+        cmd = ['cmake', '--build', str(self.build_path).replace("\\", "/")]
         if self.config.resources.jobs > 0:
-            cmd += ['-j', str(self.config.resources.jobs)]
+            cmd += self._parallel_args(self.config.resources.jobs)
 
         logging.info(" ".join(map(str, cmd)))
 
+        ccache_before = self.docker.ccache_stats()
         exit_code, stdout, stderr, _ = self.docker.run_command_in_docker(cmd, self.root, check=False)
         self.cmake_build_output.append(stdout)
+        if ccache_before:
+            add_stats(self.ccache_stats, stats_delta(ccache_before, self.docker.ccache_stats()))
         if exit_code == 0:
             logging.info(f"CMake build completed for {self.root}")
             logging.debug(f"Output:\n{stdout}")
@@ -642,40 +864,46 @@ class CMakeProcess:
             exit_code, stdout, stderr, time = self.docker.run_command_in_docker(
                 command, self.root, workdir=self.config.testing.docker_test_dir/self.test_path, check=False, timeout=self.config.max_test_time, log=False,
             )
+            return self._record_ctest(command, exit_code, stdout, stderr, time)
+            
+        except Exception as e:
+            logging.error(f"CTest execution failed: {e}", exc_info=True)
+            return False
 
-            # parse the times returned
-            stats = parse_ctest_output(stdout)
-            elapsed: float = stats['total_time_sec']
+    def _record_ctest(self, command: list[str], exit_code: int, stdout: str, stderr: str, time: float, stats: Optional[dict] = None) -> bool:
+        if 0.0 not in self.test_time['parsed'] or 0.0 not in self.test_time['time']:
+            # too many tests
+            return True
 
-            idx = self.test_time['parsed'].index(0.0)
-            self.test_time['parsed'][idx] = elapsed
-            idx = self.test_time['time'].index(0.0)
-            self.test_time['time'][idx] = time
+        # parse the times returned, <stats> is the resource usage of the run
+        ctest_stats = parse_ctest_output(stdout)
+        elapsed: float = ctest_stats['total_time_sec']
 
-            self.ctest_output.append(stdout)
-            self.per_test_times = parse_single_ctest_output(stdout, self.per_test_times)
+        idx = self.test_time['parsed'].index(0.0)
+        self.test_time['parsed'][idx] = elapsed
+        idx = self.test_time['time'].index(0.0)
+        self.test_time['time'][idx] = time
+        self._record_stats(idx, stats)
 
-            if exit_code == 0 and stats['total'] > 0:
-                logging.info(f"CTest passed for {self.test_path}")
-                logging.debug(f"Output:\n{stdout}")
-                logging.info(f"Tests run: {stats['total']}, Failures: {stats['failed']}, Skipped: {stats['skipped']}, Time elapsed: {elapsed or time} s")
-            else:
-                logging.error(f"CTest failed for {self.test_path} (return code {exit_code}) with command {' '.join(command)}", exc_info=True)
-                logging.info(f"Tests run: {stats['total']}, Failures: {stats['failed']}, Skipped: {stats['skipped']}, Time elapsed: {elapsed or time} s")
-                if stdout: logging.error(f"Output (stdout):\n{stdout}", exc_info=True)
-                if stderr: logging.error(f"Error (stderr):\n{stderr}", exc_info=True)
-                return False
-            
-            # TODO: run this tests, each with different profile
-            #cmd = ['LLVM_PROFILE_FILE=coverage/%t.profraw', exec, test_name]
-            # extract the profraw coverage without the test and build folders
-            # extract coverage data and create
-            return True
-            
-        except Exception as e:
-            logging.error(f"CTest execution failed: {e}", exc_info=True)
+        self.ctest_output.append(stdout)
+        self.per_test_times = parse_single_ctest_output(stdout, self.per_test_times)
+
+        if exit_code == 0 and ctest_stats['total'] > 0:
+            logging.info(f"CTest passed for {self.test_path}")
+            logging.debug(f"Output:\n{stdout}")
+            logging.info(f"Tests run: {ctest_stats['total']}, Failures: {ctest_stats['failed']}, Skipped: {ctest_stats['skipped']}, Time elapsed: {elapsed or time} s")
+        else:
+            logging.error(f"CTest failed for {self.test_path} (return code {exit_code}) with command {' '.join(command)}", exc_info=True)
+            logging.info(f"Tests run: {ctest_stats['total']}, Failures: {ctest_stats['failed']}, Skipped: {ctest_stats['skipped']}, Time elapsed: {elapsed or time} s")
+            if stdout: logging.error(f"Output (stdout):\n{stdout}", exc_info=True)
+            if stderr: logging.error(f"Error (stderr):\n{stderr}", exc_info=True)
             return False
         
+        # TODO: run this tests, each with different profile
+        #cmd = ['LLVM_PROFILE_FILE=coverage/%t.profraw', exec, test_name]
+        # extract the profraw coverage without the test and build folders
+        # extract coverage data and create
+        return True
 
     def _individual_ctest(self, command: list[str], extra: list[str] = []) -> bool:
         """Runs individual tests from test frameworks (gtest, catch, doctest)"""
@@ -698,6 +926,24 @@ class CMakeProcess:
         )
         logging.debug(f"Individual CTest stdout:\n{stdout}")
 
+        elapsed: float = parse_framework_output(stdout, self.framework, test_name)
+        if elapsed == 0.0 and self.framework == "gtest" and not extra:
+            return self._individual_ctest(command, ["--gtest_repeat=100"])
+
+        return self._record_individual_ctest(command, exit_code, stdout, stderr, time)
+
+    def _record_individual_ctest(self, command: list[str], exit_code: int, stdout: str, stderr: str, time: float, stats: Optional[dict] = None) -> bool:
+        try:
+            test_name = self.unit_tests_map[" ".join(command)]['name']
+        except:
+            logging.error(f"Test mapping failed: {command}")
+            return False
+
+        if (len(self.per_test_times[test_name]['parsed']) >= len(self.test_time['parsed']) and
+            len(self.per_test_times[test_name]['time']) >= len(self.test_time['time'])):
+            # probably duplicate test_name
+            return True
+
         elapsed: float = parse_framework_output(stdout, self.framework, test_name)
                     
         if elapsed < 0.0:
@@ -705,8 +951,6 @@ class CMakeProcess:
             return False
         
         if elapsed == 0.0:
-            if self.framework == "gtest" and not extra:
-                return self._individual_ctest(command, ["--gtest_repeat=100"])
             elapsed = parse_usr_bin_time(stdout)
 
         ntest = len(self.per_test_times[test_name]['parsed'])
@@ -714,6 +958,7 @@ class CMakeProcess:
         self.per_test_times[test_name]['time'].append(time)
         self.test_time['parsed'][ntest] += elapsed
         self.test_time['time'][ntest] += time
+        self._record_stats(ntest, stats)
 
         if exit_code == 0:
             logging.info(f"Individual CTest passed for {self.test_path}")
@@ -727,6 +972,56 @@ class CMakeProcess:
 
         self.ctest_output.append(stdout)
         return True
+
+    def test_entry(self, command: list[str], has_test_framework: bool) -> Optional[dict]:
+        """
+        Schedule entry of a test command for the in-container batch runner
+        (see src/core/docker/batch.py), None if the command is not run.
+        """
+        if command and command[0] == "cd":
+            return None
+
+        if not has_test_framework:
+            return {
+                "cmd": command,
+                "cwd": self.docker.container_workdir(self.root, self.config.testing.docker_test_dir/self.test_path),
+                "timeout": self.config.max_test_time,
+            }
+
+        unit_map = self.unit_tests_map.get(" ".join(command))
+        if not unit_map:
+            logging.error(f"Test mapping failed: {command}")
+            return None
+
+        entry: dict = {
+            "cmd": command,
+            "cwd": self.docker.container_workdir(self.root),
+            "timeout": self.config.max_test_time,
+            "key": unit_map["name"],
+        }
+        if self.framework == "gtest":
+            # same fallback as _individual_ctest for tests below gtest's 1 ms resolution
+            entry["retry"] = {"pattern": r"ran\. \(0\s*ms total\)", "args": ["--gtest_repeat=100"]}
+        return entry
+
+    def record_test(self, command: list[str], has_test_framework: bool, exit_code: int, stdout: str, time: float, stats: Optional[dict] = None) -> bool:
+        """Records a test run measured by the in-container batch runner."""
+        if has_test_framework:
+            return self._record_individual_ctest(command, exit_code, stdout, "", time, stats)
+        return self._record_ctest(command, exit_code, stdout, "", time, stats)
+
+    def _record_stats(self, idx: int, stats: Optional[dict]) -> None:
+        """Adds the resource usage of a test command to repetition <idx>, the memory peak is the maximum."""
+        if not stats or idx >= len(self.run_stats):
+            return
+        run = self.run_stats[idx]
+        for key, value in stats.items():
+            if key == "memory_peak":
+                run[key] = max(run.get(key, 0), value)
+            elif key == "memory_peak_reset":
+                run[key] = run.get(key, True) and bool(value)
+            else:
+                run[key] = round(run.get(key, 0) + value, 6)
     
 
 ############### DIFF APPLICATION ###############
@@ -1,5 +1,5 @@
 import json, logging, subprocess, re, threading, jsonschema
-from typing import Any, Union, Optional
+from typing import Union, Optional
 from pathlib import Path
 from src.llm.prompt import Prompt
 from src.llm.openai import OpenRouterLLM
@@ -7,6 +7,9 @@ from src.llm.ollama import OllamaLLM
 from docker.models.containers import Container
 from src.config.config import Config
 from src.cmake.patterns import *
+from src.cmake.depstore import DependencyStore
+from src.cmake.scanner import ERROR_SCANNER
+from src.core.docker import aptcache, pool
 
 LLM_DEP_SCHEMA = {
     "type": "object",
@@ -41,62 +44,30 @@ LLM_DEP_SCHEMA = {
     },
     "additionalProperties": True,
 }
+APT_UPDATE = ["apt-get", "update"]
+APT_INSTALL = ["apt-get", "install", "-y"]
+# containers whose apt index was refreshed by a DependencyResolver of this process
+_APT_UPDATED: set[str] = set()
+# containers with a usable shared package cache (src/core/docker/aptcache.py)
+_APT_SHARED: dict[str, bool] = {}
 
 class DependencyResolver:
     
-    class DependencyCache:
-        def __init__(self, config: Config):
-            self.mapping_path = Path(config.storage_paths.get("cmake-dep", "cmake-dep.json"))
-            try:
-                with open(self.mapping_path) as f:
-                    self.mapping: dict[str, dict[str, Any]] = json.load(f)
-            except (FileNotFoundError, json.JSONDecodeError) as e:
-                logging.warning(f"Initializing empty cache ({e})")
-                self.mapping = {}
-
-        def save(self):
-            def reset_permissions(path: Path):
-                """Reset file permissions to writable"""
-                try:
-                    if path.exists():
-                        path.chmod(0o666)  # Read/write for all
-                except Exception:
-                    pass
-            
-            tmp_path = self.mapping_path.with_suffix(".tmp")
-
-            reset_permissions(self.mapping_path)
-            reset_permissions(tmp_path)
-            
-            try:
-                with open(tmp_path, "w") as f:
-                    json.dump(self.mapping, f, indent=4)
-                
-                if self.mapping_path.exists():
-                    self.mapping_path.unlink()
-                tmp_path.replace(self.mapping_path)
-                
-            except PermissionError as e:
-                try:
-                    if tmp_path.exists():
-                        tmp_path.unlink()
-                except PermissionError:
-                    pass
-                logging.error(f"Failed to save cache: {e}")
-                raise
-        
     def __init__(self, config: Config, cache=None, handler=None, llm=None):
         self.config = config
-        self.cache = cache or self.DependencyCache(self.config)
+        # an empty store is falsy (DependencyStore.__len__)
+        self.cache = cache if cache is not None else DependencyStore.shared(self.config)
+        self.release: str = "" # Ubuntu release (e.g. ubuntu:22.04) of the dependency mappings
         self.package_handler = handler or self.PackageHandler()
         self.llm = llm or self.LLMResolver(self.config)
         self.flag = self.FlagResolver(self.config)
-        self.install_cmds: list[list[str]] = [["apt-get", "update"]]
+        self.install_cmds: list[list[str]] = [list(APT_UPDATE)]
 
     def resolve_all(self, dep_names: set[str], container: Container) -> tuple[set[str], set[str]]:
         self.container = container
         unresolved: set[str] = set() 
         flags: set[str] = set()
+        packages: dict[str, list[str]] = {}
 
         dep_names = set([d[0] if isinstance(d, tuple) else d for d in list(dep_names)])
         for dep in map(str.lower, dep_names):
@@ -106,25 +77,144 @@ class DependencyResolver:
                 unresolved.add(dep)
                 continue
 
-            for method in ["apt"]: #, "vcpkg"):
-                if self.install(dep, method):
-                    flags |= self.flags(dep, method)
-                    break
-                else:
-                    self.cache.mapping.setdefault(dep, {method: ""})
+            pkg_names = info.get("apt")
+            if not pkg_names:
+                logging.warning(f"apt mapping for {dep} is missing or empty.")
+                continue
+            packages[dep] = [pkg_names] if isinstance(pkg_names, str) else list(pkg_names)
 
-            self.cache.save()
+        failed = self.install_packages(sorted({p for pkgs in packages.values() for p in pkgs}))
+        for dep, pkgs in packages.items():
+            if failed.intersection(pkgs):
+                logging.warning(f"Failed to install {dep} via apt")
+                continue
+            flags |= self.flags(dep, "apt")
 
         return unresolved, flags
         
+    def preinstall(self, dep_names: set[str], container: Container) -> tuple[set[str], set[str]]:
+        """
+        Installs the apt packages of all <dep_names> known to the dependency cache in one apt transaction
+        (packages that are already installed are skipped). A failing transaction is bisected by install_packages,
+        only the dependencies with a failed package get no flags. Returns the dependencies missing in the cache and
+        the flags of the installed ones.
+        """
+        self.container = container
+        unresolved: set[str] = set()
+        flags: set[str] = set()
+        packages: dict[str, list[str]] = {}
+
+        for dep in sorted(map(str.lower, dep_names)):
+            info = self.resolve(dep)
+            if not info:
+                unresolved.add(dep)
+                continue
+            pkg_names = info.get("apt")
+            if pkg_names:
+                packages[dep] = [pkg_names] if isinstance(pkg_names, str) else list(pkg_names)
+
+        missing = self._not_installed(sorted({p for pkgs in packages.values() for p in pkgs}))
+        if missing:
+            logging.info(f"Pre-installing {len(missing)} packages of {len(packages)} dependencies via apt...")
+        failed = self.install_packages(missing)
+
+        for dep, pkgs in packages.items():
+            if not failed.intersection(pkgs):
+                flags |= self.flags(dep, "apt")
+        return unresolved, flags
+
+    def install_packages(self, pkg_names: list[str]) -> set[str]:
+        """
+        Installs <pkg_names> in one apt transaction, the apt index is refreshed once per container.
+        A failing transaction is bisected to find the failing packages, the others are still installed.
+        Returns the packages that could not be installed.
+        """
+        if not pkg_names:
+            return set()
+        self._apt_update()
+
+        failed: set[str] = set()
+        batches = [list(pkg_names)]
+        while batches:
+            batch = batches.pop()
+            exit_code, output = self._apt(APT_INSTALL + batch)
+            if exit_code == 0:
+                self._record_install(batch)
+                logging.info(f"Installed {' '.join(batch)} via apt")
+            elif len(batch) == 1:
+                logging.warning(f"Failed to install {batch[0]} via apt: {output.decode(errors='ignore')[-1000:] if output else ''}")
+                failed.add(batch[0])
+            else:
+                half = len(batch) // 2
+                batches += [batch[half:], batch[:half]]
+        return failed
+
+    def _apt_update(self) -> None:
+        container_id = self._container_id()
+        if container_id in _APT_UPDATED:
+            return
+        if container_id in pool.ACQUIRED:
+            # pool containers ran apt-get update in their warm-up (ContainerPool._warm_up)
+            _APT_UPDATED.add(container_id)
+            return
+        exit_code, _ = self._apt(APT_UPDATE)
+        if exit_code == 0:
+            _APT_UPDATED.add(container_id)
+
+    def _apt(self, cmd: list[str]):
+        """Runs an apt-get command, through the shared package cache if it is mounted in the container."""
+        container_id = self._container_id()
+        if container_id not in _APT_SHARED:
+            _APT_SHARED[container_id] = self.config.testing.apt_cache and aptcache.prepare(self.container)
+        return self.container.exec_run(aptcache.wrap(cmd) if _APT_SHARED[container_id] else cmd)
+
+    def _container_id(self) -> str:
+        return getattr(self.container, "id", None) or str(id(self.container))
+
+    def _record_install(self, pkg_names: list[str]) -> None:
+        """Adds <pkg_names> to the (single) apt install command of install_cmds."""
+        for i, cmd in enumerate(self.install_cmds):
+            if cmd[:len(APT_INSTALL)] == APT_INSTALL:
+                self.install_cmds[i] = cmd + [p for p in pkg_names if p not in cmd[len(APT_INSTALL):]]
+                return
+        self.install_cmds.append(APT_INSTALL + list(pkg_names))
+
+    @staticmethod
+    def collapse(install_cmds: list[list[str]]) -> list[list[str]]:
+        """One apt-get update and one apt-get install of all packages, other commands in their order."""
+        packages: list[str] = []
+        others: list[list[str]] = []
+        for cmd in install_cmds:
+            if cmd[:len(APT_INSTALL)] == APT_INSTALL:
+                packages += [p for p in cmd[len(APT_INSTALL):] if p not in packages]
+            elif cmd != APT_UPDATE and cmd not in others:
+                others.append(list(cmd))
+        return [list(APT_UPDATE)] + ([APT_INSTALL + packages] if packages else []) + others
+
+    def covers(self, install_cmds: list[list[str]]) -> bool:
+        """True if <install_cmds> install nothing that install_cmds did not install."""
+        own, other = self.collapse(self.install_cmds), self.collapse(install_cmds)
+        own_packages = set(p for cmd in own if cmd[:len(APT_INSTALL)] == APT_INSTALL for p in cmd[len(APT_INSTALL):])
+        return all(
+            set(cmd[len(APT_INSTALL):]) <= own_packages if cmd[:len(APT_INSTALL)] == APT_INSTALL else cmd in own
+            for cmd in other
+        )
+
+    def _not_installed(self, pkg_names: list[str]) -> list[str]:
+        if not pkg_names:
+            return []
+        _, output = self.container.exec_run(["dpkg-query", "-W", "-f=${Package} ${Status}\n"] + pkg_names)
+        installed = {
+            line.split()[0] for line in (output.decode(errors="ignore") if output else "").splitlines()
+            if line.endswith(" installed")
+        }
+        return [p for p in pkg_names if p.split(":")[0] not in installed]
+
     def resolve(self, dep_name: str) -> dict[str, Union[str, list[str]]]:
-        if dep_name in self.cache.mapping:
-            return self.cache.mapping[dep_name]
-        else:
-            return {}
+        return self.cache.get(dep_name, self.release)
     
     def flags(self, dep_name: str, method: str) -> set[str]:
-        dep = self.cache.mapping.get(dep_name)
+        dep = self.resolve(dep_name)
         if not dep:
             return set()
 
@@ -145,16 +235,21 @@ class DependencyResolver:
         
         cmd = {
             "vcpkg": ["/opt/vcpkg/vcpkg", "install"] + pkg_names,
-            "apt": ["apt-get", "install", "-y"] + pkg_names
+            "apt": APT_INSTALL + pkg_names
         }[method]
 
         logging.info(f"Installing {dep_name} via {method}...")
         try:
             if method == "apt":
-                self.container.exec_run(["apt-get", "update"])
-            exit_code, output = self.container.exec_run(cmd)
+                self._apt_update()
+                exit_code, output = self._apt(cmd)
+            else:
+                exit_code, output = self.container.exec_run(cmd)
             if exit_code == 0: 
-                self.install_cmds.append(cmd)
+                if method == "apt":
+                    self._record_install(pkg_names)
+                else:
+                    self.install_cmds.append(cmd)
                 logging.info(f"Installed {dep_name} via {method}")
             else: 
                 logging.warning(output.decode(errors="ignore") + "\n" + str(cmd) if output else str(cmd))
@@ -191,9 +286,8 @@ class DependencyResolver:
             return unresolved_dependencies, set()
 
         data = {k.lower() if isinstance(k, str) else k: v for k, v in data.items()}
-        self.cache.mapping.update(data)
+        self.cache.upsert(data, ubuntu_ver)
         unresolved_dependencies, other_flags = self.resolve_all(unresolved_dependencies, self.container)
-        self.cache.save()
         
         logging.info(f"Added {data.keys()} to dependency cache")
         return unresolved_dependencies, other_flags
@@ -228,23 +322,17 @@ class DependencyResolver:
             return missing
         
         def _find_pkgconfig_missing(self, stdout: str, stderr: str) -> set[str]:
-            patterns = CONFIG_ERROR_PATTERNS
-            if "CMake Error" in stdout:
-                stdout = "CMake Error" + stdout.split("CMake Error", 1)[1]
-            if "CMake Error" in stderr:
-                stderr = "CMake Error" + stderr.split("CMake Error", 1)[1]
             missing = set()
-            for pattern in patterns:
-                missing.update(re.findall(pattern, stdout))
-                missing.update(re.findall(pattern, stderr))
+            for output in (stdout, stderr):
+                # only the output from the first CMake error on
+                start = max(0, output.find("CMake Error"))
+                missing.update(m.group(1) for _, m in ERROR_SCANNER.scan(output, ("config",), start))
             return missing
         
         def _find_file_missing(self, stdout, stderr) -> set[str]:
-            patterns = BUILD_ERROR_PATTERNS
             missing = set()
-            for pattern in patterns:
-                missing.update(re.findall(pattern, stdout))
-                missing.update(re.findall(pattern, stderr))
+            for output in (stdout, stderr):
+                missing.update(m.group(1) for _, m in ERROR_SCANNER.scan(output, ("build",)))
             return missing
     
     class FlagResolver:
@@ -262,12 +350,15 @@ class DependencyResolver:
             remove = set(flags["remove"])
             command: list[list[str]] = cmds
             
-            combined = "\n".join([conf_out, conf_err, build_out, build_err])
+            # first match of every pattern
+            matches: dict[int, re.Match] = {}
+            for output in (conf_out, conf_err, build_out, build_err):
+                for (_, i), match in ERROR_SCANNER.scan(output, ("flags",)):
+                    matches.setdefault(i, match)
 
-            for pattern in FLAGS_ERROR_PATTERNS:
-                match = re.search(pattern["regex"], combined, re.I)
-                if match:
-                    pattern["action"](append, remove, command, match)
+            for i, pattern in enumerate(FLAGS_ERROR_PATTERNS):
+                if i in matches:
+                    pattern["action"](append, remove, command, matches[i])
 
             return {"append": list(append), "remove": list(remove)}, command
     
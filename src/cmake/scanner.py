@@ -0,0 +1,124 @@
+import re
+try:
+    from re import _parser, _constants
+except ImportError: # Python < 3.11
+    import sre_parse as _parser, sre_constants as _constants # type: ignore
+from typing import Iterator, Optional, Union
+from src.cmake.patterns import CONFIG_ERROR_PATTERNS, GENERATOR_ERROR_PATTERNS, BUILD_ERROR_PATTERNS, FLAGS_ERROR_PATTERNS
+
+Pattern = Union[str, tuple[str, str]]
+PatternId = tuple[str, int]
+
+MIN_ANCHOR = 3 # shortest literal used to find candidate lines
+
+class LogScanner:
+    """
+    Scans configure/build output for the error patterns of several groups in one pass.
+
+    Every pattern has anchors, literals that each of its matches contains. The anchors of the
+    scanned groups are combined into one precompiled alternation that finds the candidate lines,
+    the patterns themselves only run on those lines. Patterns match within a line (^/$ are line
+    anchors), a (header, item) pattern matches <item> after <header> and on the lines that follow
+    (see patterns.py). Groups with re.I are scanned on the lowercased output.
+    """
+    def __init__(self, groups: dict[str, list[Pattern]], flags: Optional[dict[str, int]] = None):
+        self.flags = flags or {}
+        self.patterns: dict[PatternId, tuple[re.Pattern, Optional[re.Pattern]]] = {}
+        self.anchors: dict[PatternId, Optional[list[str]]] = {}
+        for group, patterns in groups.items():
+            group_flags = self.flags.get(group, 0)
+            for i, pattern in enumerate(patterns):
+                header, item = pattern if isinstance(pattern, tuple) else (pattern, None)
+                self.patterns[(group, i)] = (
+                    re.compile(header, re.M | group_flags),
+                    re.compile(item, group_flags) if item else None,
+                )
+                self.anchors[(group, i)] = self._anchors(list(_parser.parse(header, group_flags)))
+        self._finders: dict[tuple[str, ...], tuple[re.Pattern, bool, list[PatternId]]] = {}
+
+    def scan(self, text: str, groups: Optional[tuple[str, ...]] = None, start: int = 0) -> Iterator[tuple[PatternId, re.Match]]:
+        """Yields (pattern id, match) of every match in <text>[<start>:] in order of the lines."""
+        finder, lower, ids = self._finder(groups)
+        haystack = text
+        if lower:
+            haystack = text.lower()
+            if len(haystack) != len(text):
+                haystack, finder = text, re.compile(finder.pattern, re.M | re.I)
+
+        pos = start
+        while (hit := finder.search(haystack, pos)) is not None:
+            line_start = max(start, text.rfind("\n", 0, hit.start()) + 1)
+            line_end = text.find("\n", hit.start())
+            line_end = len(text) if line_end < 0 else line_end
+            for pid in ids:
+                header, item = self.patterns[pid]
+                for m in header.finditer(text, line_start, line_end):
+                    if item is None:
+                        yield pid, m
+                    else:
+                        yield from ((pid, im) for im in self._block(text, item, m.end(), line_end))
+            pos = line_end + 1
+
+    @staticmethod
+    def _block(text: str, item: re.Pattern, pos: int, line_end: int) -> Iterator[re.Match]:
+        """Matches of <item> from <pos> on up to the first non-blank line without <item>."""
+        while pos <= len(text):
+            m = item.match(text, pos, line_end)
+            if m:
+                yield m
+            elif text[pos:line_end].strip():
+                return
+            pos = line_end + 1
+            line_end = text.find("\n", pos)
+            line_end = len(text) if line_end < 0 else line_end
+
+    def _finder(self, groups: Optional[tuple[str, ...]]) -> tuple[re.Pattern, bool, list[PatternId]]:
+        key = tuple(groups) if groups else tuple(dict.fromkeys(group for group, _ in self.patterns))
+        if key not in self._finders:
+            ids = [pid for pid in self.patterns if pid[0] in key]
+            lower = any(self.flags.get(group, 0) & re.I for group in key)
+            alternatives: list[str] = []
+            for pid in ids:
+                anchors = self.anchors[pid]
+                if anchors and (not lower or all(a.isascii() for a in anchors)):
+                    alternatives += [re.escape(a.lower() if lower else a) for a in anchors]
+                else:
+                    # no usable literal, the pattern finds its own lines
+                    alternatives.append(f"(?i:{self.patterns[pid][0].pattern})" if lower else f"(?:{self.patterns[pid][0].pattern})")
+            self._finders[key] = (re.compile("|".join(dict.fromkeys(alternatives)), re.M), lower, ids)
+        return self._finders[key]
+
+    @classmethod
+    def _anchors(cls, seq: list) -> Optional[list[str]]:
+        """Literals of which every match of the parsed pattern <seq> contains one, None if unknown."""
+        best = run = ""
+        for op, av in seq:
+            if op is _constants.LITERAL:
+                run += chr(av)
+            else:
+                best, run = max(best, run, key=len), ""
+        best = max(best, run, key=len)
+        if len(best) >= MIN_ANCHOR:
+            return [best]
+
+        # a group/alternation that is not repeated: one anchor per branch
+        for op, av in seq:
+            if op is _constants.SUBPATTERN:
+                anchors = cls._anchors(list(av[-1]))
+                if anchors:
+                    return anchors
+            elif op is _constants.BRANCH:
+                branches = [cls._anchors(list(branch)) for branch in av[1]]
+                if all(branches):
+                    return [anchor for branch in branches for anchor in branch] # type: ignore
+        return None
+
+ERROR_SCANNER = LogScanner(
+    {
+        "config": CONFIG_ERROR_PATTERNS,
+        "generator": GENERATOR_ERROR_PATTERNS,
+        "build": BUILD_ERROR_PATTERNS,
+        "flags": [pattern["regex"] for pattern in FLAGS_ERROR_PATTERNS],
+    },
+    flags={"flags": re.I},
+)
@@ -0,0 +1,127 @@
+import re
+from typing import Iterator, Optional
+from cmakeast.printer import ast
+
+# one token (after whitespace) per match, the alternatives are tried in order
+TOKEN_PATTERN = re.compile(r"""
+    [ \t\r\n]*
+    (?:
+        (?P<comment>\#(?:\[(?P<comment_eq>=*)\[.*?\](?P=comment_eq)\]|[^\n]*))
+        |(?P<bracket>\[(?P<bracket_eq>=*)\[.*?\](?P=bracket_eq)\])
+        |(?P<quoted>"(?:[^"\\]|\\.)*")
+        |(?P<open>\()
+        |(?P<close>\))
+        |(?P<unquoted>(?:[^\s()\#"\\]|\\.)(?:[^\s()"\\]|\\.|"(?:[^"\\]|\\.)*")*)
+        |(?P<other>.)
+        |(?P<end>\Z)
+    )
+""", re.X | re.S)
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+NUMBER = re.compile(r"-?[0-9]+")
+DEREF = re.compile(r"\$\{[A-Za-z_][A-Za-z0-9_]*\}")
+
+# block commands and the commands that end their bodies
+BLOCKS = {"function": "endfunction", "macro": "endmacro", "foreach": "endforeach", "while": "endwhile"}
+BLOCK_NODES = {"function": ast.FunctionDefinition, "macro": ast.MacroDefinition, "foreach": ast.ForeachStatement, "while": ast.WhileStatement}
+IF_TERMINATORS = ("elseif", "else", "endif")
+
+def _word_type(kind: str, contents: str) -> int:
+    if kind != "unquoted":
+        return ast.WordType.String
+    first = contents[0]
+    if first == "$" and DEREF.fullmatch(contents):
+        return ast.WordType.VariableDereference
+    if (first == "-" or first.isdigit()) and NUMBER.fullmatch(contents):
+        return ast.WordType.Number
+    if IDENTIFIER.fullmatch(contents):
+        return ast.WordType.Variable
+    return ast.WordType.CompoundLiteral
+
+def commands(content: str) -> Iterator[ast.FunctionCall]:
+    """
+    Command invocations of the CMake code <content> in file order. Arguments are flat words with
+    their source text as contents (quoted and bracket arguments keep their delimiters, nested
+    parentheses are words of their own), comments are skipped. Malformed code is skipped.
+    """
+    line, counted = 1, 0 # line of the position counted
+    name: Optional[tuple[str, int, int, int]] = None # pending command name (name, line, col, index)
+    call: Optional[tuple[str, int, int, int]] = None # command whose arguments are read
+    arguments: list[ast.Word] = []
+    depth = 0
+    for index, m in enumerate(TOKEN_PATTERN.finditer(content)):
+        kind = m.lastgroup
+        if kind == "comment" or kind == "end":
+            continue
+        if call is not None and kind == "close" and depth == 1:
+            yield ast.FunctionCall(name=call[0], arguments=arguments, line=call[1], col=call[2], index=call[3])
+            call, arguments, depth = None, [], 0
+            continue
+        if call is None and kind == "open":
+            if name is not None:
+                call, name, depth = name, None, 1
+            continue
+        if call is None and kind != "unquoted":
+            name = None
+            continue
+
+        contents = m.group(kind) # type: ignore
+        start = m.start(kind) # type: ignore
+        line += content.count("\n", counted, start)
+        counted = start
+        col = start - content.rfind("\n", 0, start)
+        if call is None:
+            name = (contents, line, col, index) if IDENTIFIER.fullmatch(contents) else None
+        elif kind == "open" or kind == "close":
+            depth += 1 if kind == "open" else -1
+            arguments.append(ast.Word(type=ast.WordType.CompoundLiteral, contents=contents, line=line, col=col, index=index))
+        else:
+            arguments.append(ast.Word(type=_word_type(kind, contents), contents=contents, line=line, col=col, index=index)) # type: ignore
+
+def parse(content: str) -> ast.ToplevelBody:
+    """
+    The CMake code <content> as a cmakeast tree (control flow blocks with header, body and footer).
+    Unlike cmakeast.ast.parse, blocks that are not closed end at the end of the file.
+    """
+    calls = list(commands(content))
+    _, statements = _body(calls, 0, ())
+    return ast.ToplevelBody(statements=statements)
+
+def _body(calls: list[ast.FunctionCall], i: int, ends: tuple[str, ...]) -> tuple[int, list]:
+    statements = []
+    while i < len(calls) and calls[i].name not in ends:
+        i, statement = _statement(calls, i)
+        statements.append(statement)
+    return i, statements
+
+def _statement(calls: list[ast.FunctionCall], i: int) -> tuple[int, object]:
+    header = calls[i]
+    if header.name == "if":
+        i, body = _body(calls, i + 1, IF_TERMINATORS)
+        if_statement = ast.IfStatement(header=header, body=body, line=header.line, col=header.col, index=header.index)
+        elseif_statements: list[ast.ElseIfStatement] = []
+        else_statement: Optional[ast.ElseStatement] = None
+        footer: Optional[ast.FunctionCall] = None
+        while i < len(calls):
+            terminator = calls[i]
+            if terminator.name == "endif":
+                footer = terminator
+                i += 1
+                break
+            i, body = _body(calls, i + 1, IF_TERMINATORS)
+            if terminator.name == "elseif":
+                elseif_statements.append(ast.ElseIfStatement(header=terminator, body=body, line=terminator.line, col=terminator.col, index=terminator.index))
+            else:
+                else_statement = ast.ElseStatement(header=terminator, body=body, line=terminator.line, col=terminator.col, index=terminator.index)
+        return i, ast.IfBlock(
+            if_statement=if_statement, elseif_statements=elseif_statements, else_statement=else_statement,
+            footer=footer, line=header.line, col=header.col, index=header.index
+        )
+
+    if header.name in BLOCKS:
+        i, body = _body(calls, i + 1, (BLOCKS[header.name],))
+        footer = calls[i] if i < len(calls) else None
+        return i + 1, BLOCK_NODES[header.name](
+            header=header, body=body, footer=footer, line=header.line, col=header.col, index=header.index
+        )
+
+    return i + 1, header
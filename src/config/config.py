@@ -5,7 +5,7 @@ from github import Auth, Github
 
 from src.config.prompts import Prompts
 from src.config.constants import *
-from src.config.settings import LLMSettings, TestingSettings, GitHubSettings, ResourceSettings, ResourceSettingsCrawl
+from src.config.settings import LLMSettings, TestingSettings, GitHubSettings, ResourceSettings, ResourceSettingsCrawl, TransferSettings
 from src.utils.image_handling import dockerhub_containers, check_dockerhub
 
 @dataclass
@@ -71,6 +71,8 @@ class Config:
     dockerhub_force: bool = False
     # pulls images from Dockerhub, requires DOCKER_HUB_USER and DOCKER_HUB_REPO environment variables 
     pullimages: bool = False
+    # only pushes/pulls this subset of images: a folder of json files, a commits file or image name patterns (comma-separated)
+    only: str = ""
 
     """
     OpenHands Patch
@@ -111,6 +113,7 @@ class Config:
     testing: TestingSettings = field(default_factory=TestingSettings)
     github: GitHubSettings = field(default_factory=GitHubSettings)
     resources: ResourceSettings = field(default_factory=ResourceSettings)
+    transfer: TransferSettings = field(default_factory=TransferSettings)
     prompts: Prompts = field(default_factory=Prompts)
 
     """
@@ -139,7 +142,9 @@ class Config:
         if self.use_dockerhub or self.check_dockerhub:
             self.dockerhub_user, self.dockerhub_repo = check_dockerhub()
         if self.check_dockerhub:
-            self.dockerhub_containers = dockerhub_containers(self.dockerhub_user, self.dockerhub_repo)
+            self.dockerhub_containers = dockerhub_containers(
+                self.dockerhub_user, self.dockerhub_repo, self.storage_paths["dockerhub-tags"], self.transfer.tags_ttl
+            )
         self._validate()
         self._setup_github()
 
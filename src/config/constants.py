@@ -12,8 +12,14 @@ STORAGE_PATHS = {
     "repos": DATA_DIR / "repos.txt",
     "fail": DATA_DIR / "fail.txt",
     "clones": DATA_DIR / "tmp",
+    "docker-logs": DATA_DIR / "docker_logs",
 
-    "cmake-dep": CACHE_DIR / "cmake-dep.json"
+    "cmake-dep": CACHE_DIR / "cmake-dep.json", # imported once into cmake-dep-db
+    "cmake-dep-db": CACHE_DIR / "cmake-dep.sqlite",
+    "docker-pool": CACHE_DIR / "docker-pool.lock",
+    "dep-images": CACHE_DIR / "dep-images.json",
+    "dockerhub-tags": CACHE_DIR / "dockerhub-tags.json",
+    "cmake-corpus": CACHE_DIR / "cmake-corpus" # CMake files of the dataset commits (benchmarks)
 }
 
 COMMIT_TIME = {
@@ -56,6 +62,14 @@ VALID_TEST_FLAGS: dict[str, list[str]] = {
     ]
 }
 
+# directories not searched for CMakeLists.txt, directories with a CMakeCache.txt (build trees) are skipped
+# as well; vendored code (e.g. "third_party") can be added, its find_package calls are then not seen
+CMAKE_PRUNE_DIRS = {".git", ".hg", ".svn"}
+CMAKE_PARALLEL_PARSE = 64 # CMake files from which on they are parsed in a process pool
+CMAKE_PARSER_ENGINE = "tokenizer" # "tokenizer" (src/cmake/tokenizer.py) or "cmakeast" (full cmakeast parser)
+# build trees that can be moved: binaries find the shared libraries of the build tree relative to $ORIGIN
+CMAKE_RELOCATABLE_FLAGS = ["-DCMAKE_BUILD_RPATH_USE_ORIGIN=ON"]
+
 
 DOCKER_IMAGE_MAP = {
     "ubuntu:24.04": "cpp24",
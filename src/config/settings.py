@@ -35,6 +35,31 @@ class TestingSettings:
     warmup: int = 1
     commit_test_times: int = 30
     docker_test_dir: str = "/test_workspace"
+    batch_runner: bool = True # runs all test repetitions inside the container with one exec (src/core/docker/measure.py)
+    copy_exclude: list[str] = field(default_factory=lambda: [".git"]) # file name patterns not copied into the docker container
+    dep_image_cache: bool = True # starts later commits of a repository from an image with its dependencies already installed
+    dep_image_quota: str = '50g' # max. disk usage of the cached dependency images (least recently used are removed)
+    prune_build: bool = True # removes build intermediates from the build directories before saving the docker image
+    prune_patterns: list[str] = field(default_factory=lambda: ["*.o", "*.obj", "*.o.d", "*.a", "*.gcno", "*.pch", "*.gch"])
+    prune_exclude: list[str] = field(default_factory=lambda: ["*/vcpkg_installed/*", "*/_deps/*-src/*", "*/_deps/*-subbuild/*"]) # needed to rebuild without downloading
+    preresolve_dependencies: bool = True # installs the dependencies found in the CMake files in one apt transaction before the first configure
+    incremental_build: bool = True # builds the old commit incrementally in the new commit's build tree (separate build as fallback)
+    generator: str = 'Ninja' # cmake generator if available in the container, falls back to 'Unix Makefiles' if the configuration fails ('' is cmake's default)
+    apt_cache: bool = False # shares downloaded .deb packages and package lists between the containers of a base image (docker volume apt_cache_volume-<image>)
+    apt_cache_volume: str = 'opt-repo-cpp-apt'
+    ccache: bool = True # compiles through a persistent per-repository ccache in the docker volume ccache_volume
+    ccache_volume: str = 'opt-repo-cpp-ccache'
+    ccache_max_size: str = '5G' # per repository, ccache removes its least recently used entries beyond it
+    ccache_quota: str = '50g' # total size of the volume, least recently used repository caches are removed
+
+@dataclass
+class TransferSettings:
+    """Dockerhub transfer and image archive configuration for --pushimages, --pullimages, --tar"""
+    parallel: int = 4 # concurrent image pushes/pulls
+    retries: int = 3 # attempts per image, a retry resumes with the layers already transferred
+    tags_ttl: int = 3600 # in seconds, the cached Dockerhub tag inventory (--check_dockerhub) is used without refreshing
+    tar_compression: str = '' # --tar saves <image>.tar (''), or <image>.tar.zst with 'zstd' (requires zstandard)
+    zstd_level: int = 3
 
 @dataclass
 class GitHubSettings:
@@ -52,6 +77,9 @@ class ResourceSettings:
     cpu_period: int = 100000
     jobs: int = 1 # running cmake build with -j = jobs
     max_parallel_jobs: int = 1 # tests multiple test commits at the same time
+    pool_size: int = 1 # pre-warmed idle containers per base image (0 disables the container pool)
+    pool_mem_budget: str = '8g' # max. total mem_limit of idle pool containers
+    pool_max_age: int = 6 * 3600 # in seconds, idle pool containers (and their apt lists) older than this are replaced
     
 @dataclass
 class ResourceSettingsCrawl(ResourceSettings):
@@ -62,4 +90,5 @@ class ResourceSettingsCrawl(ResourceSettings):
     memswap_limit: str = '32g'
     cpu_quota: int = 400000
     cpu_period: int = 100000
-    jobs: int = 4
\ No newline at end of file
+    jobs: int = 4
+    pool_mem_budget: str = '64g'
\ No newline at end of file
@@ -9,6 +9,7 @@ from src.core.pipelines.pipeline import (
     PatchPipeline
 )
 from src.config.config import Config
+from src.core.docker.pool import ContainerPool
 
 class Controller:
     """
@@ -66,8 +67,18 @@ class Controller:
             raise
 
         finally:
+            self._drain_pool()
             logging.info("Controller execution completed.")
 
+    def _drain_pool(self) -> None:
+        pool = ContainerPool(self.config)
+        if not pool.enabled:
+            return
+        try:
+            pool.drain()
+        except Exception as e:
+            logging.warning(f"Failed to drain the container pool: {e}")
+
     def _collect(self) -> None:
         logging.info("Collecting popular GitHub repositories...")
         pipeline = CollectionPipeline(self.config)
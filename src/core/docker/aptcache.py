@@ -0,0 +1,35 @@
+import re
+from src.config.config import Config
+
+APT_CACHE_DIR = "/var/cache/apt-shared"
+# the .deb archives and package lists live in the volume instead of /var/cache/apt/archives and
+# /var/lib/apt/lists, which the docker-clean hook of the Ubuntu images empties after every install
+APT_OPTIONS = [
+    "-o", f"Dir::Cache::Archives={APT_CACHE_DIR}/archives/",
+    "-o", f"Dir::State::Lists={APT_CACHE_DIR}/lists/",
+]
+
+def volumes(config: Config, base_image: str) -> dict:
+    """Package cache volume of the Ubuntu release of <base_image> (one of the base images), empty if disabled."""
+    if not config.testing.apt_cache or base_image not in config.docker_map.values():
+        return {}
+    volume = f"{config.testing.apt_cache_volume}-{re.sub(r'[^A-Za-z0-9_.-]', '_', base_image)}"
+    return {volume: {"bind": APT_CACHE_DIR, "mode": "rw"}}
+
+def prepare(container) -> bool:
+    """True if the package cache volume is mounted and usable in <container>."""
+    exit_code, _ = container.exec_run([
+        "sh", "-c",
+        f"test -w {APT_CACHE_DIR} && command -v flock >/dev/null && "
+        f"mkdir -p {APT_CACHE_DIR}/archives/partial {APT_CACHE_DIR}/lists/partial"
+    ])
+    return exit_code == 0
+
+def wrap(cmd: list[str]) -> list[str]:
+    """
+    Runs an apt-get command against the shared cache. The containers of a release share the
+    apt locks of the volume, so concurrent apt-get calls are serialized with flock.
+    """
+    if cmd[:1] != ["apt-get"]:
+        return cmd
+    return ["flock", f"{APT_CACHE_DIR}/lock", "apt-get", *APT_OPTIONS, *cmd[1:]]
@@ -0,0 +1,100 @@
+import io, json, logging, tarfile, random
+from pathlib import Path
+from typing import Generator, Optional
+from src.core.docker.manager import DockerManager
+
+RUNNER_SCRIPT = Path(__file__).with_name("measure.py")
+
+class BatchRunner:
+    """
+    Runs a whole measurement campaign (all test commands, repetitions and the
+    randomised new/old interleaving) inside the container with a single docker exec.
+    The timing is done in the container by src/core/docker/measure.py.
+    """
+    def __init__(self, docker: DockerManager, runner_dir: str = "/tmp/runner"):
+        self.docker = docker
+        self.runner_dir = runner_dir
+        self.completed = False
+
+    def install(self) -> bool:
+        """Copies the runner script into the container, False if it cannot run there."""
+        container = self.docker.container
+        if not container:
+            logging.error(f"No docker container started")
+            return False
+
+        exit_code, _ = container.exec_run(["python3", "--version"])
+        if exit_code != 0:
+            logging.warning("python3 is not available in the docker container")
+            return False
+
+        return self._put_files({"measure.py": RUNNER_SCRIPT.read_bytes()})
+
+    def run(self, pairs: list[dict[str, Optional[dict]]], repetitions: int, seed: Optional[int] = None) -> Generator[dict, None, None]:
+        """Yields one record per test run, see src/core/docker/measure.py for the format."""
+        self.completed = False
+        container = self.docker.container
+        if not container:
+            logging.error(f"No docker container started")
+            return
+
+        schedule = {
+            "pairs": pairs,
+            "repetitions": repetitions,
+            "seed": seed if seed is not None else random.randrange(2**32),
+            "stop_on_failure": True,
+        }
+        if not self._put_files({"schedule.json": json.dumps(schedule).encode()}):
+            return
+
+        cmd = ["python3", f"{self.runner_dir}/measure.py", f"{self.runner_dir}/schedule.json"]
+        _, stream = container.exec_run(cmd, stream=True)
+
+        buffer = b""
+        for chunk in stream:
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                record = self._parse(line)
+                if record is None:
+                    continue
+                if "done" in record:
+                    self.completed = bool(record["done"])
+                    continue
+                yield record
+
+        if buffer.strip() and (record := self._parse(buffer)) is not None:
+            if "done" in record:
+                self.completed = bool(record["done"])
+            else:
+                yield record
+
+    def _parse(self, line: bytes) -> Optional[dict]:
+        try:
+            return json.loads(line)
+        except json.JSONDecodeError:
+            logging.warning(f"Unexpected batch runner output: {line.decode(errors='ignore')[:1000]}")
+            return None
+
+    def _put_files(self, files: dict[str, bytes]) -> bool:
+        container = self.docker.container
+        if not container:
+            return False
+
+        tarstream = io.BytesIO()
+        with tarfile.open(fileobj=tarstream, mode="w") as tar:
+            dirinfo = tarfile.TarInfo(name=Path(self.runner_dir).name)
+            dirinfo.type = tarfile.DIRTYPE
+            dirinfo.mode = 0o755
+            tar.addfile(dirinfo)
+            for name, data in files.items():
+                tarinfo = tarfile.TarInfo(name=f"{Path(self.runner_dir).name}/{name}")
+                tarinfo.size = len(data)
+                tarinfo.mode = 0o755
+                tar.addfile(tarinfo, io.BytesIO(data))
+        tarstream.seek(0)
+
+        if not container.put_archive(str(Path(self.runner_dir).parent), tarstream.read()):
+            logging.error(f"Copying {', '.join(files)} into {self.runner_dir} failed.")
+            return False
+        return True
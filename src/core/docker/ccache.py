@@ -0,0 +1,75 @@
+import re
+from src.config.config import Config
+
+CCACHE_DIR = "/ccache"
+# removes the least recently used repository caches in $1 (oldest mtime first) until they are below $2 bytes, except $3
+CCACHE_EVICT_SCRIPT = r'''
+root=$1; quota=$2; keep=$3
+total=$(du -sb "$root" | cut -f1)
+[ "$total" -gt "$quota" ] || exit 0
+for d in $(ls -tr "$root"); do
+    [ "$total" -gt "$quota" ] || break
+    [ "$d" = "$keep" ] && continue
+    size=$(du -sb "$root/$d" | cut -f1)
+    rm -rf "${root:?}/$d" && total=$((total - size)) && echo "$d $size"
+done
+'''
+# ccache >= 4 (--print-stats) and ccache 3 (-s) counters
+PRINT_STATS_KEYS = {
+    "direct_cache_hit": "direct_hits",
+    "preprocessed_cache_hit": "preprocessed_hits",
+    "cache_miss": "misses",
+}
+SUMMARY_PATTERNS = {
+    "direct_hits": re.compile(r"^cache hit \(direct\)\s+(\d+)", re.M),
+    "preprocessed_hits": re.compile(r"^cache hit \(preprocessed\)\s+(\d+)", re.M),
+    "misses": re.compile(r"^cache miss\s+(\d+)", re.M),
+}
+
+def volumes(config: Config) -> dict:
+    """Docker volume with the per-repository compiler caches, empty if ccache is disabled."""
+    if not config.testing.ccache:
+        return {}
+    return {config.testing.ccache_volume: {"bind": CCACHE_DIR, "mode": "rw"}}
+
+def cache_key(repo_id: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "__", repo_id)
+
+def environment(config: Config, repo_id: str) -> dict[str, str]:
+    """
+    ccache settings of the build commands. Paths below the workspace are hashed relative to it and
+    the build directory is not hashed, so the new and old commit share cache entries.
+    """
+    return {
+        "CCACHE_DIR": f"{CCACHE_DIR}/{cache_key(repo_id)}",
+        "CCACHE_BASEDIR": f"{config.testing.docker_test_dir}/workspace",
+        "CCACHE_NOHASHDIR": "1",
+        "CCACHE_MAXSIZE": config.testing.ccache_max_size,
+    }
+
+def parse_stats(output: str) -> dict[str, int]:
+    """Hit/miss counters of 'ccache --print-stats' or 'ccache -s', empty if not parsable."""
+    stats: dict[str, int] = {}
+    for line in output.splitlines():
+        parts = line.split("\t")
+        if len(parts) == 2 and parts[0] in PRINT_STATS_KEYS and parts[1].strip().isdigit():
+            stats[PRINT_STATS_KEYS[parts[0]]] = int(parts[1])
+    if not stats:
+        for key, pattern in SUMMARY_PATTERNS.items():
+            m = pattern.search(output)
+            if m:
+                stats[key] = int(m.group(1))
+    return stats
+
+def stats_delta(before: dict[str, int], after: dict[str, int]) -> dict[str, int]:
+    return {key: max(0, after[key] - before.get(key, 0)) for key in after}
+
+def add_stats(total: dict, delta: dict[str, int]) -> dict:
+    """Adds <delta> to <total> and updates the hit rate."""
+    for key, value in delta.items():
+        total[key] = total.get(key, 0) + value
+    hits = total.get("direct_hits", 0) + total.get("preprocessed_hits", 0)
+    calls = hits + total.get("misses", 0)
+    total["hits"] = hits
+    total["hit_rate"] = round(hits / calls, 4) if calls else 0.0
+    return total
@@ -0,0 +1,189 @@
+import hashlib, json, logging, time, uuid, docker
+from pathlib import Path
+from typing import Optional
+from src.config.config import Config
+from src.core.docker import aptcache
+from src.utils.image_handling import docker_client, delete_image, register_image
+from src.utils.lock import FileLock
+from src.utils.parser import parse_mem
+
+DEP_IMAGE_REPO = "opt-repo-cpp-deps"
+APT_UPDATE = ["apt-get", "update"]
+
+class DependencyImageCache:
+    """
+    Caches a base image (cpp20, cpp22, cpp24) with the dependencies of a repository installed
+    (DependencyResolver.install_cmds), so that later commits of the repository start from it
+    instead of repeating the apt/LLM dependency resolution loop.
+
+    Entries are keyed by (base image, sorted install commands) and are shared between repositories
+    with the same dependencies. The index lives in storage_paths["dep-images"]; least recently used
+    images are removed once the entries exceed testing.dep_image_quota.
+    """
+    def __init__(self, config: Config):
+        self.config = config
+        self.enabled = config.testing.dep_image_cache
+        self.quota = parse_mem(config.testing.dep_image_quota)
+        self.index_path = Path(config.storage_paths["dep-images"])
+        self.lock_path = self.index_path.with_suffix(".lock")
+
+    @staticmethod
+    def key(base_image: str, install_cmds: list[list[str]]) -> str:
+        cmds = sorted({json.dumps(list(map(str, cmd))) for cmd in install_cmds})
+        return hashlib.sha256(json.dumps([base_image, cmds]).encode()).hexdigest()[:16]
+
+    def lookup(self, repo_id: str, base_image: str) -> Optional[dict]:
+        """Most recently used cached image of <repo_id> on <base_image>, None if there is none."""
+        if not self.enabled:
+            return None
+
+        with FileLock(self.lock_path):
+            index = self._load()
+            entries = [
+                (key, entry) for key, entry in index.items()
+                if entry["base"] == base_image and repo_id in entry["repos"]
+            ]
+            for key, entry in sorted(entries, key=lambda e: e[1]["last_used"], reverse=True):
+                if not self._exists(entry["image"]):
+                    del index[key]
+                    continue
+                entry["last_used"] = time.time()
+                self._save(index)
+                logging.info(f"[{repo_id}] Using cached dependency image {entry['image']}")
+                return entry
+            self._save(index)
+        return None
+
+    def store(self, repo_id: str, base_image: str, install_cmds: list[list[str]], cpuset_cpus: str = "") -> Optional[str]:
+        """Builds (or reuses) the dependency image of <install_cmds> on <base_image> for <repo_id>."""
+        if not self.enabled or not any(cmd != APT_UPDATE for cmd in install_cmds):
+            return None
+
+        key = self.key(base_image, install_cmds)
+        with FileLock(self.lock_path):
+            index = self._load()
+            entry = index.get(key)
+            if entry and self._exists(entry["image"]):
+                if repo_id not in entry["repos"]:
+                    entry["repos"].append(repo_id)
+                entry["last_used"] = time.time()
+                self._save(index)
+                return entry["image"]
+
+        image_name = self._build(key, base_image, install_cmds, cpuset_cpus)
+        if not image_name:
+            return None
+
+        with FileLock(self.lock_path):
+            index = self._load()
+            entry = index.setdefault(key, {
+                "image": image_name,
+                "base": base_image,
+                "install_cmds": install_cmds,
+                "repos": [],
+                "size": self._size(image_name, base_image),
+            })
+            if repo_id not in entry["repos"]:
+                entry["repos"].append(repo_id)
+            entry["last_used"] = time.time()
+            self._evict(index, keep=key)
+            self._save(index)
+        logging.info(f"[{repo_id}] Cached dependency image {image_name}")
+        return image_name
+
+    def discard(self, repo_id: str, image_name: str) -> None:
+        """Stops using <image_name> for <repo_id>, e.g. after its environment failed to configure."""
+        with FileLock(self.lock_path):
+            index = self._load()
+            for entry in index.values():
+                if entry["image"] == image_name and repo_id in entry["repos"]:
+                    entry["repos"].remove(repo_id)
+            self._save(index)
+
+    def _build(self, key: str, base_image: str, install_cmds: list[list[str]], cpuset_cpus: str) -> Optional[str]:
+        resources = self.config.resources
+        client = docker_client()
+        try:
+            container = client.containers.run(
+                base_image,
+                command=["/bin/bash"],
+                name=f"depcache_{key}_{uuid.uuid4().hex[:8]}",
+                detach=True,
+                tty=True,
+                remove=False,
+                cpuset_cpus=cpuset_cpus or resources.cpuset_cpus or None,
+                mem_limit=resources.mem_limit,
+                memswap_limit=resources.memswap_limit,
+                cpu_quota=resources.cpu_quota,
+                cpu_period=resources.cpu_period,
+                volumes=aptcache.volumes(self.config, base_image) or None
+            )
+        except docker.errors.APIError as e: # type: ignore
+            logging.warning(f"Failed to start container for dependency image of {base_image}: {e}")
+            return None
+
+        try:
+            clean_cmds = [["apt-get", "clean"], ["sh", "-c", "rm -rf /var/lib/apt/lists/*"]]
+            shared = bool(aptcache.volumes(self.config, base_image)) and aptcache.prepare(container)
+            for cmd in install_cmds + clean_cmds:
+                cmd = list(map(str, cmd))
+                exit_code, output = container.exec_run(aptcache.wrap(cmd) if shared and cmd not in clean_cmds else cmd)
+                if exit_code != 0:
+                    logging.warning(f"Dependency image of {base_image} not cached, '{' '.join(map(str, cmd))}' failed: {output.decode(errors='ignore')[-1000:] if output else ''}")
+                    return None
+            container.commit(repository=DEP_IMAGE_REPO, tag=key)
+            image_name = f"{DEP_IMAGE_REPO}:{key}"
+            register_image(image_name)
+            return image_name
+        except docker.errors.APIError as e: # type: ignore
+            logging.warning(f"Failed to commit dependency image of {base_image}: {e}")
+            return None
+        finally:
+            try:
+                container.remove(force=True)
+            except docker.errors.APIError as e: # type: ignore
+                logging.warning(f"Failed to remove container {container.name}: {e}")
+
+    def _evict(self, index: dict[str, dict], keep: str) -> None:
+        total = sum(entry.get("size", 0) for entry in index.values())
+        for key, entry in sorted(index.items(), key=lambda e: e[1]["last_used"]):
+            if total <= self.quota:
+                break
+            if key == keep:
+                continue
+            logging.info(f"Evicting cached dependency image {entry['image']}")
+            delete_image(other=entry["image"])
+            total -= entry.get("size", 0)
+            del index[key]
+
+    def _exists(self, image_name: str) -> bool:
+        # not the per-process image index, the image may have been evicted by another worker
+        try:
+            docker_client().images.get(image_name)
+        except docker.errors.ImageNotFound: # type: ignore
+            return False
+        register_image(image_name)
+        return True
+
+    def _size(self, image_name: str, base_image: str) -> int:
+        """Size of the dependency layers on top of the base image."""
+        try:
+            images = docker_client().images
+            return max(0, images.get(image_name).attrs["Size"] - images.get(base_image).attrs["Size"])
+        except docker.errors.APIError as e: # type: ignore
+            logging.warning(f"Failed to inspect {image_name}: {e}")
+            return 0
+
+    def _load(self) -> dict[str, dict]:
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self, index: dict[str, dict]) -> None:
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(index, f, indent=4)
+        tmp_path.replace(self.index_path)
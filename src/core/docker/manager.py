@@ -1,9 +1,76 @@
-import logging, posixpath, docker, os, time, shlex
+import logging, posixpath, docker, os, time, shlex, io, tarfile, tempfile, fnmatch, shutil
 from pathlib import Path
-from docker.types import Mount
-from typing import Optional
+from typing import Optional, TextIO
 from src.config.config import Config
-from src.utils.permission import check_and_fix_path_permissions
+from src.utils.image_handling import docker_client, register_image, load_image
+from src.core.docker.pool import ContainerPool
+from src.core.docker import ccache, aptcache
+from src.utils.parser import parse_mem
+
+# host-side command logs, shared by the new/old DockerManager of a container
+_LOG_FILES: dict[Path, TextIO] = {}
+LOG_BUFFER_SIZE = 1 << 20
+# source archives larger than this are spooled to disk instead of memory
+ARCHIVE_SPOOL_SIZE = 64 << 20
+# replaces files of $2 (new tree) that are identical to the same path in $1 (old tree) by hardlinks; only sources,
+# the build directory $3 is skipped except its fetched sources (_deps/*-src), an in-place write would change both trees
+DEDUPE_SCRIPT = r'''
+old=$1; new=$2; build=$3; files=0; bytes=0
+cd "$new" || exit 1
+list=$(mktemp)
+find . -path "./$build" -prune -o -type f -print > "$list"
+for d in "./$build"/_deps/*-src; do
+    [ -d "$d" ] && find "$d" -type f >> "$list"
+done
+while IFS= read -r f; do
+    o="$old/$f"
+    [ -f "$o" ] && [ ! -L "$o" ] && [ ! "$f" -ef "$o" ] || continue
+    [ "$(stat -c %s:%a:%u:%g "$f")" = "$(stat -c %s:%a:%u:%g "$o")" ] || continue
+    cmp -s "$f" "$o" || continue
+    size=$(stat -c %s "$f")
+    ln -f "$o" "$f" && files=$((files + 1)) && bytes=$((bytes + size))
+done < "$list"
+rm -f "$list"
+echo "$files $bytes"
+'''
+# prints the ELF files below $2 whose RPATH/RUNPATH contains the absolute path $1
+RPATH_SCRIPT = r'''
+from=$1; dir=$2
+command -v readelf > /dev/null || exit 2
+find "$dir" -type f \( -perm -u+x -o -name '*.so' -o -name '*.so.*' \) | while IFS= read -r f; do
+    readelf -d "$f" 2> /dev/null | grep -E '\((RPATH|RUNPATH)\)' | grep -qF -- "$from" && echo "$f"
+done
+exit 0
+'''
+# makes the sources of $2 identical to $1 (except the directory $3), changed files get a new mtime, prints the changed files
+SYNC_SCRIPT = r'''
+src=$1; dst=$2; skip=$3
+cd "$src" || exit 1
+find . -path "./$skip" -prune -o -type f -print | while IFS= read -r f; do
+    cmp -s "$f" "$dst/$f" && continue
+    mkdir -p "$(dirname "$dst/$f")" && rm -f "$dst/$f" && cp -p "$f" "$dst/$f" && touch "$dst/$f" && echo "$f"
+done
+cd "$dst" || exit 1
+find . -path "./$skip" -prune -o -type f -print | while IFS= read -r f; do
+    [ -e "$src/$f" ] || { rm -f "$f" && echo "$f"; }
+done
+'''
+# rewrites the absolute path $1 to $2 (same length) in the CMake/Make/Ninja metadata and symlinks below $3,
+# keeping their mtimes; compiled binaries, archives and data files are not touched
+RELOCATE_SCRIPT = r'''
+from=$1; to=$2; dir=$3
+ref=$(mktemp)
+find "$dir" -type f \( -name CMakeCache.txt -o -name '*.cmake' -o -name Makefile -o -name '*.make' -o -name '*.ninja' \
+    -o -name .ninja_log -o -name '*.d' -o -name link.txt -o -name compile_commands.json \) \
+    -exec grep -lF -- "$from" {} + | while IFS= read -r f; do
+    touch -r "$f" "$ref" && sed -i "s#$from#$to#g" "$f" && touch -r "$ref" "$f"
+done
+rm -f "$ref"
+find "$dir" -type l | while IFS= read -r l; do
+    t=$(readlink "$l")
+    case "$t" in "$from"*) ln -sfn "$to${t#"$from"}" "$l";; esac
+done
+'''
 
 class DockerManager:
     def __init__(self, config: Config, mount: Path, docker_image: str, docker_test_dir: str, new: bool = False):
@@ -12,8 +79,15 @@ class DockerManager:
         self.docker_image = docker_image
         self.new = new
         self.docker_test_dir = docker_test_dir
+        self.container_name: str = ""
         self.client: Optional[docker.DockerClient] = None
         self.container: Optional[docker.models.containers.Container] = None # type: ignore
+        self._workdirs: set[str] = set()
+        self._logs_since: Optional[float] = None
+        self._log_paths: set[Path] = set() # host logs opened by this manager, truncated on the first open
+        self.environment: dict[str, str] = {}
+        self.base_image: str = docker_image # base image (cpp20, cpp22, cpp24) the container image is built on
+        self.ccache: bool = False
 
     def stop_container(self, msg: str) -> None:
         if self.container:
@@ -24,9 +98,11 @@ class DockerManager:
                 logging.info(f"[{msg}] Stopped the container")
             except Exception as e:
                 logging.warning(f"[{msg}] Failed to stop container: {e}")
+        self.close_logs()
 
     def start_docker_container(self, container_name: str, cpuset_cpus: str = "") -> None:
-        self.client = docker.from_env()
+        self.client = docker_client()
+        self.container_name = container_name
         try:
             self.container = self.client.containers.get(container_name)
             if self.container and self.container.status != "running":
@@ -36,19 +112,17 @@ class DockerManager:
         except docker.errors.NotFound: # type: ignore
             self.container = None
 
+        if self.container is None:
+            self.container = ContainerPool(self.config).acquire(self.docker_image, container_name, cpuset_cpus)
+        if self.container:
+            return
+
         try:
-            if not check_and_fix_path_permissions(self.mount):
-                return
-            
-            logging.info(f"Run docker image ({self.docker_image}) mounted on {str(self.mount)}.")
-            mounts = []
-            if self.mount:
-                mounts.append(Mount(target="/workspace", source=str(self.mount), type="bind", read_only=False))
+            logging.info(f"Run docker image ({self.docker_image}).")
             self.container = self.client.containers.run(
                 self.docker_image,
                 command=["/bin/bash"],
                 name=container_name,
-                mounts=mounts,
                 working_dir="/workspace",
                 detach=True,
                 tty=True,
@@ -57,7 +131,8 @@ class DockerManager:
                 mem_limit=self.config.resources.mem_limit,
                 memswap_limit=self.config.resources.memswap_limit,
                 cpu_quota=self.config.resources.cpu_quota,
-                cpu_period=self.config.resources.cpu_period
+                cpu_period=self.config.resources.cpu_period,
+                volumes={**ccache.volumes(self.config), **aptcache.volumes(self.config, self.base_image)} or None
             )
             if not self.container:
                 raise ValueError("Docker Container did not execute")
@@ -84,28 +159,228 @@ class DockerManager:
         else:
             logging.warning(f"Command failed in docker: {cmd}")
         output = output.decode(errors="ignore") if output else ""
-        logs = self.container.logs().decode()
+        logs = self._read_logs()
         if output: logging.info(f"Output: {output}")
         if logs: logging.info(f"Logs: {logs}")
 
 
-    def run_command_in_docker(self, cmd: list[str], root: Path, workdir: Optional[Path] = None, check: bool = True, timeout: int = -1, log: bool = True) -> tuple[int, str, str, float]:
-        rel_root = os.path.relpath(root, self.mount)
-        container_root = posixpath.join(f"/workspace", rel_root.replace("\\", "/"))
+    def container_workdir(self, root: Path, workdir: Optional[Path] = None) -> str:
+        """
+        Maps a host root/workdir below the mount to its copy in {docker_test_dir}/workspace,
+        other paths are already paths inside the container.
+        """
+        path = Path(workdir) if workdir else Path(root)
+        try:
+            rel = path.resolve().relative_to(Path(self.mount).resolve())
+        except ValueError:
+            return posixpath.normpath(path.as_posix())
+        return posixpath.normpath(posixpath.join(f"{self.docker_test_dir}/workspace", rel.as_posix()))
 
-        if workdir:
-            rel_workdir = os.path.relpath(workdir, self.mount).replace("\\", "/")
-            container_workdir = posixpath.join(f"/workspace", rel_workdir)
-        else:
-            container_workdir = container_root
+    def copy_to_container(self, source: Path, dest: str, exclude: list[str] = []) -> bool:
+        """
+        Streams the host directory <source> into the container directory <dest> as a tar archive.
+        Files and directories whose name matches one of the <exclude> patterns (e.g. '.git') are skipped.
+        """
+        if not self.container:
+            logging.error(f"No docker container started")
+            return False
+
+        dest = posixpath.normpath(dest)
+        parent, name = posixpath.split(dest)
+
+        def tar_filter(tarinfo: tarfile.TarInfo) -> Optional[tarfile.TarInfo]:
+            if any(fnmatch.fnmatch(posixpath.basename(tarinfo.name), pattern) for pattern in exclude):
+                return None
+            tarinfo.uid = tarinfo.gid = 0
+            tarinfo.uname = tarinfo.gname = "root"
+            return tarinfo
+
+        with tempfile.SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_SIZE) as tarstream:
+            with tarfile.open(fileobj=tarstream, mode="w") as tar:
+                tar.add(str(source), arcname=name, filter=tar_filter)
+            size = tarstream.tell()
+            tarstream.seek(0)
+
+            self.container.exec_run(["mkdir", "-p", parent])
+            # small archives are sent from memory, larger ones are streamed from the spooled file
+            data = tarstream.read() if size <= ARCHIVE_SPOOL_SIZE else tarstream
+            if not self.container.put_archive(parent, data):
+                logging.error(f"Copying {source} into {dest} failed.")
+                return False
+
+        logging.info(f"Copied {source} into {dest} ({size / (1 << 20):.1f} MiB, excluded: {exclude})")
+        return True
+
+    def disk_usage(self, path: str) -> int:
+        """Bytes used by <path> in the container (hardlinked files are counted once)."""
+        if not self.container:
+            return 0
+        exit_code, output = self.container.exec_run(["du", "-sb", path])
+        try:
+            return int(output.decode(errors="ignore").split()[0]) if exit_code == 0 else 0
+        except (IndexError, ValueError):
+            return 0
+
+    def prune(self, dirs: list[str], patterns: list[str], exclude: list[str] = [], keep: list[str] = []) -> tuple[int, int]:
+        """
+        Deletes the files in <dirs> whose name matches one of <patterns>, except paths matching <exclude>
+        and the files in <keep>. Returns the number of files and bytes deleted.
+        """
+        if not self.container or not dirs or not patterns:
+            return 0, 0
+
+        names: list[str] = []
+        for pattern in patterns:
+            names += ["-o", "-name", pattern] if names else ["-name", pattern]
+        cmd = ["find", *dirs, "-type", "f", "(", *names, ")"]
+        for path in [*exclude, *keep]:
+            cmd += ["!", "-path", path]
+        cmd += ["-printf", "%s\n", "-delete"]
+
+        _, output = self.container.exec_run(cmd)
+        sizes = [int(line) for line in (output.decode(errors="ignore") if output else "").splitlines() if line.isdigit()]
+        logging.info(f"Pruned {len(sizes)} files ({sum(sizes) / (1 << 20):.1f} MiB) from {', '.join(dirs)}")
+        return len(sizes), sum(sizes)
+
+    def enable_ccache(self, repo_id: str) -> bool:
+        """
+        Compiles through the persistent ccache of <repo_id> in the ccache volume. The new commit also
+        removes the least recently used caches of other repositories beyond testing.ccache_quota.
+        """
+        if not self.container or not self.config.testing.ccache:
+            return False
+        exit_code, _ = self.container.exec_run(["ccache", "--version"])
+        if exit_code != 0:
+            logging.warning(f"[{repo_id}] ccache is not available in {self.docker_image}, building without compiler cache")
+            return False
+        exit_code, _ = self.container.exec_run(["test", "-d", ccache.CCACHE_DIR])
+        if exit_code != 0:
+            logging.warning(f"[{repo_id}] ccache volume is not mounted in {self.container_name}, building without compiler cache")
+            return False
+
+        self.environment = ccache.environment(self.config, repo_id)
+        cache_dir = self.environment["CCACHE_DIR"]
+        self.container.exec_run(["sh", "-c", f"mkdir -p {shlex.quote(cache_dir)} && touch {shlex.quote(cache_dir)}"])
+        if self.new:
+            quota = parse_mem(self.config.testing.ccache_quota)
+            _, output = self.container.exec_run(["sh", "-c", ccache.CCACHE_EVICT_SCRIPT, "evict", ccache.CCACHE_DIR, str(quota), ccache.cache_key(repo_id)])
+            for line in (output.decode(errors="ignore") if output else "").splitlines():
+                logging.info(f"Evicted compiler cache {line}")
+        self.ccache = True
+        logging.info(f"[{repo_id}] Using compiler cache {cache_dir}")
+        return True
+
+    def ccache_stats(self) -> dict[str, int]:
+        """Cumulative hit/miss counters of the compiler cache, empty if unavailable."""
+        if not self.container or not self.ccache:
+            return {}
+        for cmd in (["ccache", "--print-stats"], ["ccache", "-s"]):
+            exit_code, output = self.container.exec_run(cmd, environment=self.environment)
+            if exit_code == 0 and (stats := ccache.parse_stats(output.decode(errors="ignore") if output else "")):
+                return stats
+        return {}
+
+    def dedupe_trees(self, old_dir: str, new_dir: str, build_dir: str = "build") -> tuple[int, int]:
+        """
+        Hardlinks the files of <new_dir> that are identical to the same file in <old_dir>, so that
+        the committed image layer stores them once. Returns the number of files and bytes saved.
+        A hardlinked file is shared by both trees, so only files that are not written in place are
+        deduplicated: the sources, not the build directory <build_dir> (tests write their data there)
+        apart from the fetched sources in its _deps/*-src.
+        """
+        if not self.container:
+            logging.error(f"No docker container started")
+            return 0, 0
+
+        exit_code, output = self.container.exec_run(["sh", "-c", DEDUPE_SCRIPT, "dedupe", old_dir, new_dir, build_dir])
+        output = output.decode(errors="ignore").strip() if output else ""
+        try:
+            files, size = map(int, output.splitlines()[-1].split())
+        except (IndexError, ValueError):
+            logging.warning(f"Deduplicating {new_dir} against {old_dir} failed ({exit_code}): {output[-1000:]}")
+            return 0, 0
+
+        logging.info(f"Hardlinked {files} files ({size / (1 << 20):.1f} MiB) of {new_dir} to {old_dir}")
+        return files, size
+
+    def sync_tree(self, source: str, dest: str, skip: str) -> Optional[int]:
+        """
+        Makes the files of <dest> identical to <source>, except the subdirectory <skip> (the build tree).
+        Unchanged files keep their mtime, so an incremental build only recompiles what changed.
+        Returns the number of changed files, None on failure.
+        """
+        if not self.container:
+            return None
+        exit_code, output = self.container.exec_run(["sh", "-c", SYNC_SCRIPT, "sync", source, dest, skip])
+        output = output.decode(errors="ignore") if output else ""
+        if exit_code != 0:
+            logging.warning(f"Syncing {source} into {dest} failed ({exit_code}): {output[-1000:]}")
+            return None
+        return len(output.splitlines())
+
+    def relocate_tree(self, old_path: str, new_path: str, directory: str) -> bool:
+        """Replaces the absolute path <old_path> by <new_path> (same length) in the build metadata below <directory>."""
+        if not self.container or len(old_path) != len(new_path):
+            return False
+        exit_code, output = self.container.exec_run(["sh", "-c", RELOCATE_SCRIPT, "relocate", old_path, new_path, directory])
+        if exit_code != 0:
+            logging.warning(f"Relocating {directory} from {old_path} to {new_path} failed ({exit_code}): {output.decode(errors='ignore')[-1000:] if output else ''}")
+            return False
+        return True
+
+    def absolute_rpaths(self, path: str, directory: str) -> Optional[list[str]]:
+        """ELF files below <directory> whose RPATH/RUNPATH contains <path>, None if they cannot be inspected."""
+        if not self.container:
+            return None
+        exit_code, output = self.container.exec_run(["sh", "-c", RPATH_SCRIPT, "rpath", path, directory])
+        output = output.decode(errors="ignore") if output else ""
+        if exit_code != 0:
+            logging.warning(f"Inspecting the RPATHs below {directory} failed ({exit_code}): {output[-1000:]}")
+            return None
+        return output.splitlines()
+
+    def commit_layer(self, base_image: str, image_name: str) -> bool:
+        """
+        Commits {docker_test_dir} of the container as a single layer on top of <base_image>
+        (the dependency image of the repository) instead of committing the whole container.
+        """
+        if not self.container:
+            logging.error(f"No docker container started")
+            return False
+
+        client = docker_client()
+        try:
+            layer = client.containers.create(base_image, command=["/bin/bash"], working_dir="/workspace", tty=True)
+        except docker.errors.APIError as e: # type: ignore
+            logging.warning(f"Failed to create a container of {base_image}: {e}")
+            return False
+
+        try:
+            stream, _ = self.container.get_archive(self.docker_test_dir)
+            if not layer.put_archive(posixpath.dirname(self.docker_test_dir), stream):
+                logging.warning(f"Copying {self.docker_test_dir} onto {base_image} failed.")
+                return False
+            layer.commit(repository=image_name)
+            register_image(image_name)
+            logging.info(f"Committed {self.docker_test_dir} as {image_name} on top of {base_image}")
+            return True
+        except docker.errors.APIError as e: # type: ignore
+            logging.warning(f"Committing {image_name} on top of {base_image} failed: {e}")
+            return False
+        finally:
+            try:
+                layer.remove(force=True)
+            except docker.errors.APIError as e: # type: ignore
+                logging.warning(f"Failed to remove container {layer.name}: {e}")
+
+    def run_command_in_docker(self, cmd: list[str], root: Path, workdir: Optional[Path] = None, check: bool = True, timeout: int = -1, log: bool = True) -> tuple[int, str, str, float]:
+        container_workdir = self.container_workdir(root, workdir)
         
         if not self.container:
             logging.error(f"No docker container started")
             return 1, "", "", -1.0
 
-        test_cmd = ["test", "-d", container_workdir]
-        exit_code, _ = self.container.exec_run(test_cmd)
-        if exit_code != 0:
+        if not self._is_workdir(container_workdir):
             container_workdir = "/workspace"
 
         cmd = [str(x) for x in cmd]
@@ -118,17 +393,94 @@ class DockerManager:
             f'echo $(( (end - start)/1000000 ))" ms"; exit $status'
         ]
         start = time.perf_counter()
-        exit_code, output = self.container.exec_run(timed_cmd, workdir=str(container_workdir))
+        exit_code, output = self.container.exec_run(timed_cmd, workdir=str(container_workdir), environment=self.environment or None)
         if exit_code == 0 and log:
             logging.info(f"Command run in docker: {cmd}")
         elif log:
             logging.warning(f"Command failed in docker: {cmd}")
         end = time.perf_counter()
         output = output.decode(errors="ignore") if output else ""
-        logs = self.container.logs().decode()
-        self.container.exec_run(["bash", "-c", f"echo '{output}\n{logs}' >> {self.docker_test_dir}/logs/{'new' if self.new else 'old'}.log"])
+        logs = self._read_logs()
+        self.write_log(f"{output}\n{logs}\n")
+        if cmd[0] == "rm":
+            self._forget_workdirs(cmd[1:])
         return exit_code, output, logs, end-start
     
+    def _is_workdir(self, container_workdir: str) -> bool:
+        """Checks (once per directory) that the workdir exists in the container."""
+        if container_workdir in self._workdirs:
+            return True
+        if not self.container:
+            return False
+        exit_code, _ = self.container.exec_run(["test", "-d", container_workdir])
+        if exit_code == 0:
+            self._workdirs.add(container_workdir)
+        return exit_code == 0
+
+    def _forget_workdirs(self, paths: list[str]) -> None:
+        """Drops cached workdirs that lie under a removed path."""
+        for path in paths:
+            if path.startswith("-"):
+                continue
+            path = posixpath.normpath(path)
+            self._workdirs = {w for w in self._workdirs if w != path and not w.startswith(path + "/")}
+
+    def _read_logs(self) -> str:
+        """Reads only the container logs written since the previous call."""
+        if not self.container:
+            return ""
+        now = time.time()
+        if self._logs_since is None:
+            logs = self.container.logs()
+        else:
+            logs = self.container.logs(since=self._logs_since)
+        self._logs_since = now
+        return logs.decode(errors="ignore") if logs else ""
+
+    def log_path(self) -> Path:
+        """Host-side log file of the commands run for the new or old commit."""
+        log_dir = Path(self.config.storage_paths["docker-logs"]) / (self.container_name or self.docker_image)
+        return log_dir / f"{'new' if self.new else 'old'}.log"
+
+    def write_log(self, msg: str) -> None:
+        path = self.log_path()
+        log_file = _LOG_FILES.get(path)
+        if log_file is None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # a log left behind by an earlier run of the same container is overwritten
+            mode = "a" if path in self._log_paths else "w"
+            log_file = open(path, mode, encoding="utf-8", errors="ignore", buffering=LOG_BUFFER_SIZE)
+            _LOG_FILES[path] = log_file
+            self._log_paths.add(path)
+        log_file.write(msg)
+
+    def close_logs(self) -> None:
+        """Closes the host-side logs of this container and removes their directory."""
+        log_dir = self.log_path().parent
+        for path in [p for p in _LOG_FILES if p.parent == log_dir]:
+            _LOG_FILES.pop(path).close()
+        self._log_paths = {p for p in self._log_paths if p.parent != log_dir}
+        shutil.rmtree(log_dir, ignore_errors=True)
+
+    def copy_logs_to_container(self) -> None:
+        """Copies the host-side new/old command logs into {docker_test_dir}/logs."""
+        if not self.container:
+            return
+        log_dir = self.log_path().parent
+        for path, log_file in _LOG_FILES.items():
+            if path.parent == log_dir:
+                log_file.flush()
+
+        tarstream = io.BytesIO()
+        with tarfile.open(fileobj=tarstream, mode="w") as tar:
+            for name in ("new.log", "old.log"):
+                if (log_dir / name).exists():
+                    tar.add(str(log_dir / name), arcname=name)
+        tarstream.seek(0)
+
+        if not self.container.put_archive(f"{self.docker_test_dir}/logs", tarstream.read()):
+            logging.error(f"Copying {log_dir} into docker container failed.")
+    
 
     def copy_commands_to_container(
             self, project_root: Path, 
@@ -147,7 +499,6 @@ class DockerManager:
                 logging.error(f"Copying the commands to {save}.sh failed with: {exit_code}")
         
 
-    def load_docker_image(self, tar_path: Path):
-        self.client = docker.from_env()
-        with open(tar_path, "rb") as f:
-            self.client.images.load(f.read())
\ No newline at end of file
+    def load_docker_image(self, tar_path: Path) -> list[str]:
+        self.client = docker_client()
+        return load_image(tar_path)
\ No newline at end of file
@@ -0,0 +1,228 @@
+"""
+In-container batch measurement runner.
+
+Copied once into the container by BatchRunner (src/core/docker/batch.py) and
+run with a single `docker exec`. Only uses the standard library, so that it runs
+with the python3 of every base image (Ubuntu 18.04+).
+
+Usage: python3 measure.py <schedule.json>
+
+Schedule:
+    {
+        "pairs": [{"new": <entry>|null, "old": <entry>|null}, ...],
+        "repetitions": <int>,
+        "seed": <int>,
+        "stop_on_failure": <bool>
+    }
+    <entry> = {"cmd": [...], "cwd": "...", "timeout": <s>, "retry": {"pattern": "...", "args": [...]}}
+
+Every run is written to stdout as one JSON line:
+    {"pair": i, "rep": r, "label": "new"|"old", "rc": exit_code, "ns": wall_time_ns, "out": output, "stats": {...}}
+followed by a final {"done": true|false} line.
+
+"stats" holds the resource usage of the run: the deltas of the container cgroup
+counters (cpu.stat, memory.events, memory.stat; cgroup v2 or v1) and of
+getrusage(RUSAGE_CHILDREN), plus the memory high-water mark after the run.
+Counters that are not available in the container are left out.
+"""
+import json, os, random, re, resource, subprocess, sys, time
+
+try:
+    _now_ns = time.perf_counter_ns
+except AttributeError:
+    def _now_ns():
+        return int(time.perf_counter() * 1e9)
+
+TIMEOUT_EXIT_CODE = 124 # same as coreutils timeout
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+# cgroup counters that are reported as the difference before/after a run
+CGROUP_V2_COUNTERS = {
+    "cpu.stat": {
+        "usage_usec": "cpu_usage_usec", "user_usec": "cpu_user_usec", "system_usec": "cpu_system_usec",
+        "nr_periods": "nr_periods", "nr_throttled": "nr_throttled", "throttled_usec": "throttled_usec",
+    },
+    "memory.events": {"high": "memory_high_events", "max": "memory_max_events", "oom_kill": "oom_kill"},
+    "memory.stat": {
+        "pgfault": "cgroup_pgfault", "pgmajfault": "cgroup_pgmajfault",
+        "workingset_refault_file": "workingset_refault_file",
+    },
+}
+CGROUP_V1_COUNTERS = {
+    "cpu/cpu.stat": {"nr_periods": "nr_periods", "nr_throttled": "nr_throttled", "throttled_time": "throttled_usec"},
+    "cpuacct/cpuacct.stat": {"user": "cpu_user_usec", "system": "cpu_system_usec"},
+    "memory/memory.stat": {
+        "total_pgfault": "cgroup_pgfault", "total_pgmajfault": "cgroup_pgmajfault",
+    },
+}
+# cgroup v1 units: throttled_time is in ns, cpuacct.stat in USER_HZ ticks
+CGROUP_V1_SCALE = {
+    "throttled_usec": 1e-3,
+    "cpu_user_usec": 1e6 / os.sysconf("SC_CLK_TCK"),
+    "cpu_system_usec": 1e6 / os.sysconf("SC_CLK_TCK"),
+}
+RUSAGE_COUNTERS = {
+    "ru_utime": "utime_s", "ru_stime": "stime_s", "ru_minflt": "minflt", "ru_majflt": "majflt",
+    "ru_nvcsw": "nvcsw", "ru_nivcsw": "nivcsw", "ru_inblock": "inblock", "ru_oublock": "oublock",
+}
+
+
+def read_keyed(path, names):
+    counters = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 2 and parts[0] in names:
+                    counters[names[parts[0]]] = int(parts[1])
+    except (OSError, ValueError):
+        pass
+    return counters
+
+
+def read_value(path):
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def counters():
+    """Snapshot of the cumulative cgroup and child rusage counters."""
+    values = {}
+    if os.path.exists(os.path.join(CGROUP_ROOT, "cgroup.controllers")):
+        for name, names in CGROUP_V2_COUNTERS.items():
+            values.update(read_keyed(os.path.join(CGROUP_ROOT, name), names))
+    else:
+        for name, names in CGROUP_V1_COUNTERS.items():
+            for key, value in read_keyed(os.path.join(CGROUP_ROOT, name), names).items():
+                values[key] = value * CGROUP_V1_SCALE.get(key, 1)
+        usage = read_value(os.path.join(CGROUP_ROOT, "cpuacct/cpuacct.usage"))
+        if usage is not None:
+            values["cpu_usage_usec"] = usage / 1000.0
+
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    for attr, key in RUSAGE_COUNTERS.items():
+        values[key] = getattr(usage, attr)
+    return values
+
+
+class MemoryPeak(object):
+    """
+    Memory high-water mark of the container cgroup during a run. memory.peak (cgroup v2)
+    is reset per open file (Linux 6.12+), memory.max_usage_in_bytes (cgroup v1) globally.
+    Where neither can be reset, the peak since the container start is reported.
+    """
+    def __init__(self):
+        self.file = None
+        self.reset = False
+        for name in ("memory.peak", "memory/memory.max_usage_in_bytes"):
+            path = os.path.join(CGROUP_ROOT, name)
+            if not os.path.exists(path):
+                continue
+            try:
+                self.file = open(path, "r+")
+                self.file.write("0\n")
+                self.file.flush()
+                self.reset = True
+            except OSError:
+                if self.file is None:
+                    try:
+                        self.file = open(path)
+                    except OSError:
+                        continue
+            break
+
+    def read(self):
+        if self.file is None:
+            return None
+        try:
+            self.file.seek(0)
+            return int(self.file.read().strip())
+        except (OSError, ValueError):
+            return None
+        finally:
+            self.file.close()
+            self.file = None
+
+
+def stats(before, after, peak):
+    delta = {}
+    for key, value in after.items():
+        if key in before:
+            delta[key] = round(value - before[key], 6)
+    reset = peak.reset
+    value = peak.read()
+    if value is not None:
+        delta["memory_peak"] = value
+        delta["memory_peak_reset"] = reset
+    return delta
+
+
+def run(entry):
+    cwd = entry.get("cwd") or "/"
+    if not os.path.isdir(cwd):
+        cwd = "/workspace" if os.path.isdir("/workspace") else "/"
+    timeout = entry.get("timeout") or None
+    if timeout is not None and timeout <= 0:
+        timeout = None
+
+    peak = MemoryPeak()
+    before = counters()
+    start = _now_ns()
+    try:
+        proc = subprocess.run(
+            entry["cmd"], cwd=cwd, timeout=timeout,
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+        )
+        rc, out = proc.returncode, proc.stdout
+    except subprocess.TimeoutExpired as e:
+        rc, out = TIMEOUT_EXIT_CODE, e.stdout or b""
+    except OSError as e:
+        rc, out = 127, str(e).encode()
+    end = _now_ns()
+    return rc, out.decode(errors="ignore"), end - start, stats(before, counters(), peak)
+
+
+def measure(entry):
+    rc, out, ns, usage = run(entry)
+    retry = entry.get("retry")
+    if retry and re.search(retry["pattern"], out):
+        rc, out, ns, usage = run(dict(entry, cmd=entry["cmd"] + retry["args"], retry=None))
+    return rc, out, ns, usage
+
+
+def emit(record):
+    sys.stdout.write(json.dumps(record, separators=(",", ":")) + "\n")
+    sys.stdout.flush()
+
+
+def main(argv):
+    with open(argv[1]) as f:
+        schedule = json.load(f)
+
+    rng = random.Random(schedule.get("seed"))
+    repetitions = schedule.get("repetitions", 1)
+    stop_on_failure = schedule.get("stop_on_failure", True)
+
+    for i, pair in enumerate(schedule["pairs"]):
+        for rep in range(repetitions):
+            order = ["new", "old"]
+            rng.shuffle(order)
+            for label in order:
+                entry = pair.get(label)
+                if not entry:
+                    continue
+                rc, out, ns, usage = measure(entry)
+                emit({"pair": i, "rep": rep, "label": label, "rc": rc, "ns": ns, "out": out, "stats": usage})
+                if rc != 0 and stop_on_failure:
+                    emit({"done": False})
+                    return 1
+
+    emit({"done": True})
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
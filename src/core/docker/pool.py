@@ -0,0 +1,214 @@
+import logging, threading, uuid, time, os, docker
+import multiprocessing.util
+from pathlib import Path
+from typing import Optional
+from src.config.config import Config
+from src.utils.image_handling import docker_client
+from src.core.docker import ccache, aptcache
+from src.utils.lock import FileLock
+from src.utils.parser import parse_mem
+
+POOL_LABEL = "opt-repo-cpp.pool"
+POOL_RESOURCES_LABEL = "opt-repo-cpp.pool.resources"
+POOL_CREATED_LABEL = "opt-repo-cpp.pool.created"
+# containers are only handed out once their warm-up finished and they were renamed from WARMING to IDLE
+WARMING_PREFIX = "poolwarm_"
+IDLE_PREFIX = "pool_"
+# ids of the containers handed out by acquire in this process, their apt index was refreshed in the warm-up
+ACQUIRED: set[str] = set()
+# background refills of this process, joined (not killed while creating a container) by drain and at process exit
+_REFILLS: list[threading.Thread] = []
+_STOPPING = threading.Event() # no refills once set
+_FINALIZED_PID = 0 # process that registered stop_refills as exit finalizer
+
+def stop_refills() -> None:
+    """Stops the background refills of this process after their current container and waits for them."""
+    _STOPPING.set()
+    for thread in list(_REFILLS):
+        thread.join()
+    _REFILLS.clear()
+
+def commit_changes() -> list[str]:
+    """'docker commit' arguments that clear the pool labels, an image committed from a pool container is no pool image."""
+    return [arg for label in (POOL_LABEL, POOL_RESOURCES_LABEL, POOL_CREATED_LABEL) for arg in ("--change", f'LABEL {label}=""')]
+
+class ContainerPool:
+    """
+    Keeps pre-warmed, resource-limited idle containers of the base images (cpp20, cpp22, cpp24)
+    so that starting a container and the first 'apt-get update' are off the critical path.
+
+    Pool containers live in the docker daemon and are shared by all processes of the pipeline
+    (acquiring one is serialized with a file lock). A handed-out container is used by a single
+    commit/repository and destroyed afterwards; the pool is refilled in the background.
+    """
+    def __init__(self, config: Config):
+        self.config = config
+        self.resources = config.resources
+        self.size = config.resources.pool_size
+        self.budget = parse_mem(config.resources.pool_mem_budget)
+        self.lock_path = Path(config.storage_paths["docker-pool"])
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def images(self) -> set[str]:
+        return set(self.config.docker_map.values())
+
+    def acquire(self, docker_image: str, container_name: str, cpuset_cpus: str = ""):
+        """Renames an idle pool container of <docker_image> to <container_name>, None if there is none."""
+        if not self.enabled or docker_image not in self.images():
+            return None
+
+        client = docker_client()
+        container = None
+        with self._locked():
+            for idle in self._idle(docker_image):
+                try:
+                    idle.rename(container_name)
+                    container = idle
+                    break
+                except docker.errors.APIError as e: # type: ignore
+                    logging.warning(f"Failed to take pool container {idle.name}: {e}")
+
+        if container is None:
+            self.refill(docker_image, background=True)
+            return None
+
+        cpuset = cpuset_cpus or self.resources.cpuset_cpus
+        if cpuset:
+            try:
+                container.update(cpuset_cpus=cpuset)
+            except docker.errors.APIError as e: # type: ignore
+                logging.warning(f"Failed to pin pool container {container_name} to cpus {cpuset}: {e}")
+
+        logging.info(f"Took pre-warmed container of {docker_image} as {container_name}")
+        self.refill(docker_image, background=True)
+        ACQUIRED.add(container.id)
+        return client.containers.get(container.id)
+
+    def warm(self, images: Optional[set[str]] = None, background: bool = True) -> None:
+        """Fills the pool of every base image (or <images>) up to pool_size idle containers."""
+        if not self.enabled:
+            return
+        for docker_image in sorted(images or self.images()):
+            self.refill(docker_image, background)
+
+    def refill(self, docker_image: str, background: bool = True) -> None:
+        global _FINALIZED_PID
+        if not self.enabled or _STOPPING.is_set():
+            return
+        if not background:
+            self._refill(docker_image)
+            return
+        if _FINALIZED_PID != os.getpid():
+            # multiprocessing runs its finalizers before it joins the threads of an exiting (worker) process
+            multiprocessing.util.Finalize(None, stop_refills, exitpriority=10)
+            _FINALIZED_PID = os.getpid()
+        _REFILLS[:] = [thread for thread in _REFILLS if thread.is_alive()]
+        thread = threading.Thread(target=self._refill, args=(docker_image,))
+        _REFILLS.append(thread)
+        thread.start()
+
+    def drain(self) -> None:
+        """Removes all idle (and warming) pool containers, after the refills of this process stopped."""
+        stop_refills()
+        client = docker_client()
+        with self._locked():
+            for container in client.containers.list(all=True, filters={"label": POOL_LABEL}):
+                if not container.name.startswith((IDLE_PREFIX, WARMING_PREFIX)):
+                    continue
+                try:
+                    container.remove(force=True)
+                    logging.info(f"Removed pool container {container.name}")
+                except docker.errors.APIError as e: # type: ignore
+                    logging.warning(f"Failed to remove pool container {container.name}: {e}")
+
+    def _refill(self, docker_image: str) -> None:
+        try:
+            self._expire()
+            while not _STOPPING.is_set():
+                with self._locked():
+                    pooled = self._pooled()
+                    count = sum(1 for c in pooled if c.labels.get(POOL_LABEL) == docker_image)
+                    reserved = len(pooled) * parse_mem(self.resources.mem_limit)
+                    if count >= self.size or reserved + parse_mem(self.resources.mem_limit) > self.budget:
+                        return
+                    container = self._create(docker_image)
+                if container is None or not self._warm_up(container):
+                    return
+        except Exception as e:
+            logging.warning(f"Refilling the container pool of {docker_image} failed: {e}")
+
+    def _create(self, docker_image: str):
+        name = f"{WARMING_PREFIX}{docker_image}_{uuid.uuid4().hex[:8]}"
+        try:
+            return docker_client().containers.run(
+                docker_image,
+                command=["/bin/bash"],
+                name=name,
+                working_dir="/workspace",
+                detach=True,
+                tty=True,
+                remove=False,
+                labels={
+                    POOL_LABEL: docker_image,
+                    POOL_RESOURCES_LABEL: self._resources_key(),
+                    POOL_CREATED_LABEL: str(int(time.time())),
+                },
+                cpuset_cpus=self.resources.cpuset_cpus or None,
+                mem_limit=self.resources.mem_limit,
+                memswap_limit=self.resources.memswap_limit,
+                cpu_quota=self.resources.cpu_quota,
+                cpu_period=self.resources.cpu_period,
+                volumes={**ccache.volumes(self.config), **aptcache.volumes(self.config, docker_image)} or None
+            )
+        except docker.errors.APIError as e: # type: ignore
+            logging.warning(f"Failed to start pool container of {docker_image}: {e}")
+            return None
+
+    def _warm_up(self, container) -> bool:
+        docker_test_dir = self.config.testing.docker_test_dir
+        apt_update = ["apt-get", "update"]
+        if aptcache.volumes(self.config, container.labels.get(POOL_LABEL, "")) and aptcache.prepare(container):
+            apt_update = aptcache.wrap(apt_update)
+        for cmd in (["mkdir", "-p", docker_test_dir, f"{docker_test_dir}/logs"], apt_update):
+            exit_code, output = container.exec_run(cmd)
+            if exit_code != 0:
+                logging.warning(f"Warm-up of pool container {container.name} failed ({' '.join(cmd)}): {output.decode(errors='ignore')[-1000:] if output else ''}")
+                container.remove(force=True)
+                return False
+        container.rename(container.name.replace(WARMING_PREFIX, IDLE_PREFIX, 1))
+        logging.info(f"Pool container {container.name} is ready")
+        return True
+
+    def _expire(self) -> None:
+        """Destroys idle containers whose package lists are older than pool_max_age."""
+        now = time.time()
+        with self._locked():
+            for container in self._idle():
+                created = int(container.labels.get(POOL_CREATED_LABEL, "0"))
+                if now - created > self.resources.pool_max_age:
+                    logging.info(f"Removing expired pool container {container.name}")
+                    container.remove(force=True)
+
+    def _pooled(self) -> list:
+        """Idle and warming pool containers with the current resource limits."""
+        containers = docker_client().containers.list(all=True, filters={"label": f"{POOL_RESOURCES_LABEL}={self._resources_key()}"})
+        return [c for c in containers if c.name.startswith((IDLE_PREFIX, WARMING_PREFIX))]
+
+    def _idle(self, docker_image: str = "") -> list:
+        return [
+            c for c in self._pooled()
+            if c.name.startswith(IDLE_PREFIX) and c.status == "running"
+            and (not docker_image or c.labels.get(POOL_LABEL) == docker_image)
+        ]
+
+    def _resources_key(self) -> str:
+        r = self.resources
+        volume = self.config.testing.ccache_volume if self.config.testing.ccache else ""
+        apt_volume = self.config.testing.apt_cache_volume if self.config.testing.apt_cache else ""
+        return f"{r.mem_limit}/{r.memswap_limit}/{r.cpu_quota}/{r.cpu_period}/{volume}/{apt_volume}"
+
+    def _locked(self):
+        return FileLock(self.lock_path)
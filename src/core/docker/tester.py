@@ -2,6 +2,7 @@ import logging, os, stat, shutil, random, json
 from tqdm import tqdm
 from src.core.filter.process_filter import ProcessFilter
 from src.cmake.process import CMakeProcess
+from src.core.docker.batch import BatchRunner
 from src.config.config import Config
 from src.utils.test_analyzer import TestAnalyzer
 from pathlib import Path
@@ -35,10 +36,12 @@ class DockerTester:
                 logging.error(f"new process ({new_process}) or old process ({old_process}) failed.")
                 return
 
+            # cached before the image is saved, so that the image is a layer on top of it
+            dep_image = new_process.cache_dependencies(old_process.resolver.install_cmds)
             if self.config.genimages and not self.config.test:
-                self._gen_image_only(repo, new_process, old_process, new_sha)
+                self._gen_image_only(repo, new_process, old_process, new_sha, dep_image)
             else:
-                self._analyzer_results(repo, new_process, old_process, new_sha, old_sha)
+                self._analyzer_results(repo, new_process, old_process, new_sha, old_sha, dep_image)
                         
 
     @contextmanager
@@ -119,7 +122,7 @@ class DockerTester:
             if not new_process:
                 raise UndefinedStructureFilter("New commit CMakeProcess is None")
             
-            old_process = old_pf.commit_setup_and_build("Old", repo, old_sha, container_name=container_name, startup=False)
+            old_process = old_pf.commit_setup_and_build("Old", repo, old_sha, container_name=container_name, startup=False, base=new_process)
             
             if not old_process:
                 raise UndefinedStructureFilter("Old commit CMakeProcess is None")
@@ -148,6 +151,13 @@ class DockerTester:
         test_repeat = self.config.testing.commit_test_times
         msg = f"{repo.full_name}:{new_sha}" if repo else self.config.docker_image
 
+        if self.config.testing.batch_runner:
+            runner = BatchRunner(new_process.docker)
+            if runner.install():
+                self._batch_test(runner, msg, new_process, old_process, has_test_framework, new_test_cmd, old_test_cmd)
+                return
+            logging.warning(f"[{msg}] Batch runner unavailable, running each test repetition with a separate exec")
+
         for new_cmd, old_cmd in tqdm(zip(new_test_cmd, old_test_cmd), total=len(new_test_cmd), position=1, leave=False, mininterval=5): 
             for _ in tqdm(range(warmup+test_repeat), total=warmup+test_repeat, desc="Commit pair test", position=2, leave=False, mininterval=5):
                 order = [
@@ -164,9 +174,46 @@ class DockerTester:
                         #process.docker.stop_container(repo.full_name if repo else self.config.docker_image)
                         raise TestFailed(f"Test run '{cmd}' failed")
                     logging.debug(f"[{msg}] {label} build and test successful")
+
+    def _batch_test(self, runner: BatchRunner, msg: str, new_process: CMakeProcess, old_process: CMakeProcess, has_test_framework: bool, new_test_cmd: list[list[str]], old_test_cmd: list[list[str]]) -> None:
+        """Runs all test repetitions of the commit pair with the in-container batch runner."""
+        repetitions = self.config.testing.warmup + self.config.testing.commit_test_times
+        pairs: list[dict[str, Optional[dict]]] = []
+        pair_cmds: list[dict[str, list[str]]] = []
+        seen: set[tuple[Optional[str], Optional[str]]] = set()
+
+        for new_cmd, old_cmd in zip(new_test_cmd, old_test_cmd):
+            new_entry = new_process.test_entry(new_cmd, has_test_framework)
+            old_entry = old_process.test_entry(old_cmd, has_test_framework)
+            if not new_entry and not old_entry:
+                continue
+            keys = ((new_entry or {}).get("key"), (old_entry or {}).get("key"))
+            if has_test_framework and keys in seen:
+                # duplicate test names are only measured once (see CMakeProcess._individual_ctest)
+                continue
+            seen.add(keys)
+            pairs.append({"new": new_entry, "old": old_entry})
+            pair_cmds.append({"new": new_cmd, "old": old_cmd})
+
+        processes = {"new": ("New", new_process), "old": ("Old", old_process)}
+        total = sum(repetitions * sum(1 for e in pair.values() if e) for pair in pairs)
+        for record in tqdm(runner.run(pairs, repetitions), total=total, desc="Commit pair test", position=1, leave=False, mininterval=5):
+            label, process = processes[record["label"]]
+            cmd = pair_cmds[record["pair"]][record["label"]]
+            # keep the " ms" line of the former per-exec timing wrapper for parse_usr_bin_time
+            stdout = f"{record['out']}\n{record['ns'] // 1_000_000} ms"
+            process.docker.write_log(f"{stdout}\n")
+
+            if not process.record_test(cmd, has_test_framework, record["rc"], stdout, record["ns"] / 1e9, record.get("stats")):
+                logging.error(f"[{msg}] {label} test failed")
+                raise TestFailed(f"Test run '{cmd}' failed")
+            logging.debug(f"[{msg}] {label} build and test successful")
+
+        if not runner.completed:
+            raise TestFailed(f"Batch measurement runner did not complete")
     
     
-    def _analyzer_results(self, repo: Repository, new_process: CMakeProcess, old_process: CMakeProcess, new_sha: str, old_sha: str) -> None:
+    def _analyzer_results(self, repo: Repository, new_process: CMakeProcess, old_process: CMakeProcess, new_sha: str, old_sha: str, dep_image: Optional[str] = None) -> None:
         new_cmd_times = new_process.test_time
         old_cmd_times = old_process.test_time
 
@@ -226,19 +273,23 @@ class DockerTester:
         results = test.create_test_log(
             commit, repo, old_sha, new_sha,
             old_times, new_times, new_build_cmd, old_build_cmd, new_test_cmd, old_test_cmd,
+            old_process.run_stats, new_process.run_stats,
         )
+        results["build_info"]["generator"] = {"new": new_process.generator_name(), "old": old_process.generator_name()}
+        results["build_info"]["ccache"] = {"new": new_process.ccache_stats, "old": old_process.ccache_stats}
         logging.info(f"Results: {results['performance_analysis']}")
         writer = Writer(repo.full_name, self.config.output or self.config.storage_paths["performance"])
         writer.write_results(results)
 
         if not self.config.noimage and not self.config.testdocker and not self.config.testpatch:
-            old_process.save_docker_image(repo.full_name, new_sha, new_build_cmd, old_build_cmd, new_test_cmd, old_test_cmd, results)
+            old_process.save_docker_image(repo.full_name, new_sha, new_build_cmd, old_build_cmd, new_test_cmd, old_test_cmd, results, dep_image)
+            writer.write_results(results) # with the image_info of the saved image
             
         if total_improvement < self.config.min_p_value or overall_change_with_new_outperforms_old:
             logging.info(f"[{repo.full_name}:{new_sha}] significantly improves execution time.")
             writer.write_improve(results)
 
-    def _gen_image_only(self, repo: Repository, new_process: CMakeProcess, old_process: CMakeProcess, new_sha: str):
+    def _gen_image_only(self, repo: Repository, new_process: CMakeProcess, old_process: CMakeProcess, new_sha: str, dep_image: Optional[str] = None):
         '''Generates the docker image from an existing json results file'''
         new_build_cmd = [" ".join(s) for s in new_process.build_commands]
         old_build_cmd = [" ".join(s) for s in old_process.build_commands]
@@ -256,10 +307,10 @@ class DockerTester:
         results["build_info"]["old_test_script"] = old_test_cmd
         results["build_info"]["new_test_script"] = new_test_cmd
 
+        old_process.save_docker_image(repo.full_name, new_sha, new_build_cmd, old_build_cmd, new_test_cmd, old_test_cmd, results, dep_image)
+
         with open(json_file, 'w', errors='ignore') as f:
             json.dump(results, f, indent=4)
-
-        old_process.save_docker_image(repo.full_name, new_sha, new_build_cmd, old_build_cmd, new_test_cmd, old_test_cmd, results)
         logging.info(f"[{repo.full_name}:{new_sha}] Docker image saved.")
 
     def _remove_commits_folders(self, msg: str, new_path: Path, old_path: Path) -> None:
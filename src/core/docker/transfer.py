@@ -0,0 +1,125 @@
+import logging, time, docker
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, Optional
+from tqdm import tqdm
+from src.config.config import Config
+from src.utils.image_handling import docker_client, register_image
+
+class ImageTransfer:
+    """
+    Pushes/pulls the dataset images to/from <dockerhub_user>/<dockerhub_repo> with
+    transfer.parallel concurrent transfers through the docker daemon.
+
+    Images whose local and remote manifest digests are identical are skipped. A failed transfer
+    is retried (transfer.retries); the daemon keeps the layers that were already transferred,
+    so a retry or a rerun after an interruption resumes at layer granularity.
+    The bandwidth is not capped: the daemon transfers independently of how fast its progress stream
+    is read (it only keeps the latest event), transfer.parallel bounds the concurrent transfers.
+    """
+    def __init__(self, config: Config):
+        self.config = config
+        self.settings = config.transfer
+        self.remote_repo = f"{config.dockerhub_user}/{config.dockerhub_repo}"
+
+    def remote(self, local_image: str) -> str:
+        return f"{self.remote_repo}:{local_image}"
+
+    def push(self, local_images: list[str], force: bool = False) -> dict[str, str]:
+        return self._run("Pushing images", lambda local_image: self._push_one(local_image, force), local_images)
+
+    def pull(self, local_images: list[str]) -> dict[str, str]:
+        return self._run("Pulling images", self._pull_one, local_images)
+
+    def _run(self, desc: str, transfer: Callable[[str], str], local_images: list[str]) -> dict[str, str]:
+        """Runs <transfer> for every image concurrently, returns the status per image."""
+        status: dict[str, str] = {}
+        with ThreadPoolExecutor(max_workers=max(1, self.settings.parallel)) as executor:
+            futures = {executor.submit(transfer, local_image): local_image for local_image in local_images}
+            for future in tqdm(as_completed(futures), total=len(futures), desc=desc, mininterval=5):
+                local_image = futures[future]
+                try:
+                    status[local_image] = future.result()
+                except Exception as e:
+                    logging.exception(f"Transfer of {local_image} failed: {e}")
+                    status[local_image] = "failed"
+
+        counts = {s: list(status.values()).count(s) for s in sorted(set(status.values()))}
+        logging.info(f"{desc}: {counts}")
+        return status
+
+    def _push_one(self, local_image: str, force: bool) -> str:
+        client = docker_client()
+        remote_image = self.remote(local_image)
+        try:
+            image = client.images.get(local_image)
+        except docker.errors.ImageNotFound: # type: ignore
+            logging.warning(f"Local image {local_image} not found, not pushed")
+            return "missing"
+
+        remote_digest = self._remote_digest(remote_image)
+        if not force and remote_digest and remote_digest in self._local_digests(local_image):
+            logging.info(f"{remote_image} is up to date ({remote_digest})")
+            return "skipped"
+
+        image.tag(self.remote_repo, tag=local_image)
+        register_image(remote_image)
+        logging.info(f"Pushing {remote_image} to Dockerhub")
+        stream = lambda: client.api.push(self.remote_repo, tag=local_image, stream=True, decode=True)
+        return "pushed" if self._with_retries(remote_image, stream) else "failed"
+
+    def _pull_one(self, local_image: str) -> str:
+        client = docker_client()
+        remote_image = self.remote(local_image)
+
+        remote_digest = self._remote_digest(remote_image)
+        if remote_digest and remote_digest in self._local_digests(remote_image):
+            logging.info(f"{remote_image} is up to date ({remote_digest})")
+            status = "skipped"
+        else:
+            logging.info(f"Pulling {remote_image} from Dockerhub")
+            stream = lambda: client.api.pull(self.remote_repo, tag=local_image, stream=True, decode=True)
+            if not self._with_retries(remote_image, stream):
+                return "failed"
+            status = "pulled"
+
+        client.images.get(remote_image).tag(local_image)
+        register_image(remote_image)
+        register_image(local_image)
+        return status
+
+    def _with_retries(self, remote_image: str, stream: Callable[[], Iterable[dict]]) -> bool:
+        for attempt in range(max(1, self.settings.retries)):
+            try:
+                if self._consume(remote_image, stream()):
+                    return True
+            except docker.errors.APIError as e: # type: ignore
+                logging.warning(f"Transfer of {remote_image} failed: {e}")
+            if attempt + 1 < self.settings.retries:
+                wait = 2 ** attempt
+                logging.info(f"Resuming transfer of {remote_image} in {wait}s ({attempt + 2}/{self.settings.retries})")
+                time.sleep(wait)
+        return False
+
+    def _consume(self, remote_image: str, events: Iterable[dict]) -> bool:
+        """Follows the progress of a push/pull, False on an error event."""
+        for event in events:
+            if "error" in event:
+                logging.warning(f"Transfer of {remote_image} failed: {event['error']}")
+                return False
+        return True
+
+    def _remote_digest(self, remote_image: str) -> Optional[str]:
+        try:
+            return docker_client().images.get_registry_data(remote_image).id
+        except docker.errors.NotFound: # type: ignore
+            return None
+        except docker.errors.APIError as e: # type: ignore
+            logging.warning(f"Failed to inspect {remote_image} on Dockerhub: {e}")
+            return None
+
+    def _local_digests(self, image_name: str) -> set[str]:
+        try:
+            repo_digests = docker_client().images.get(image_name).attrs.get("RepoDigests") or []
+        except docker.errors.ImageNotFound: # type: ignore
+            return set()
+        return {d.split("@", 1)[1] for d in repo_digests if d.startswith(f"{self.remote_repo}@")}
@@ -25,7 +25,7 @@ class ProcessFilter:
             tmp_path = Path(tmpdir)
             process = CMakeProcess(self.config, tmp_path, None, [], CMakeAnalyzer(tmp_path), "")
         
-            if not GitHandler().clone_repo(repo.full_name, tmp_path):
+            if not GitHandler().clone_repo(repo.full_name, tmp_path, chmod=False):
                 logging.error(f"[{repo.full_name}:{sha}] git cloning failed")
                 return False
             
@@ -89,13 +89,14 @@ class ProcessFilter:
         container_name: str, 
         startup: bool = True,
         cpuset_cpus: str = "",
+        base: Optional[CMakeProcess] = None,
     ) -> Optional[CMakeProcess]:
         
         if not self.root:
             logging.error(f"[{repo.full_name}] git project root: {self.root}")
             return None
 
-        if not GitHandler().clone_repo(repo.full_name, self.root, sha=sha):
+        if not GitHandler().clone_repo(repo.full_name, self.root, sha=sha, chmod=False):
             logging.error(f"[{repo.full_name}] git cloning failed")
             return None
         
@@ -130,7 +131,7 @@ class ProcessFilter:
         enable_testing_path = test_path.relative_to(self.root) if self.root else Path()
         logging.info(f"[{repo.full_name}:{sha}] path to enable_testing(): '{enable_testing_path}'")
         try:
-            return self.build_collect_test(repo, sha, process, enable_testing_path, flags, container_name, startup, cpuset_cpus, msg)
+            return self.build_collect_test(repo, sha, process, enable_testing_path, flags, container_name, startup, cpuset_cpus, msg, base)
         except Exception as e:
             logging.error(f"[{repo.full_name}:{sha}] Unexpected error during process run: {e}")
             return None
@@ -181,7 +182,8 @@ class ProcessFilter:
         container_name: str,
         startup: bool,
         cpuset_cpus: str,
-        msg: str
+        msg: str,
+        base: Optional[CMakeProcess] = None
     ) -> Optional[CMakeProcess]:
         
         process.set_enable_testing(enable_testing_path)
@@ -195,14 +197,16 @@ class ProcessFilter:
         #else: # self.config.testdocker and not self.config.testpatch: 
 
         process.docker_image = self.config.docker_image
-        process.start_docker_image(container_name, startup, cpuset_cpus)
+        process.start_docker_image(container_name, startup, cpuset_cpus, repo.full_name)
 
         #if startup and self.config.diff and not process.diff():
         #    logging.error(f"[{repo.full_name}:{sha}] diff application to old (original) commit failed")
         #    process.docker.stop_container(repo.full_name)
         #    return None
         
-        if not process.build():
+        # the old commit is rebuilt incrementally in the build tree of the new commit (<base>) if possible
+        incremental = base is not None and self.config.testing.incremental_build and process.build_from(base)
+        if not incremental and not process.build():
             logging.error(f"[{repo.full_name}:{sha}] {msg} build failed")
             process.docker.stop_container(repo.full_name)
             return None
@@ -5,10 +5,14 @@ from src.utils.commit import CommitHandler
 from src.core.docker.tester import DockerTester
 from concurrent.futures import ProcessPoolExecutor, as_completed
 from src.utils.image_handling import config_image
+from src.core.docker.pool import ContainerPool
 from src.utils.cpu import get_available_cpus, generate_cpu_sets
+from src.cmake.parser import limit_parse_workers
 from github.Commit import Commit
 
 def run_one_commit(repo_id: str, new_sha: str, old_sha: str, config: Config, cpuset_cpus: str = ""):
+    # the CMake parse of this job stays within its share of the CPUs
+    limit_parse_workers(config.resources.cpus_per_job)
     try:
         if not config_image(config, repo_id, new_sha):
             return
@@ -41,6 +45,8 @@ class CommitTesterPipeline:
             # commits = [("", "", "")]
         else:
             commits = self.commit.get_commits(commits_list)
+            # start and 'apt-get update' the base image containers while the clones are prepared
+            ContainerPool(self.config).warm()
         if len(commits) > 0:
             logging.info(f"Commits found {len(commits)}")
         tasks: list[tuple[str, str, str, str]] = []
@@ -1,7 +1,9 @@
-import logging, subprocess, docker
+import logging, fnmatch
+from pathlib import Path
 from src.config.config import Config
 from src.utils.commit import CommitHandler
-from src.utils.image_handling import image_exists, image
+from src.utils.image_handling import image
+from src.core.docker.transfer import ImageTransfer
 
 class DockerHubPipeline():
     def __init__(self, config: Config):
@@ -16,16 +18,10 @@ class DockerHubPipeline():
             logging.warning(f"Invalid input: {self.config.input}")
     
     def _push_commits(self, commits: list[tuple[str, str, str]]) -> None:
-        for i, (repo_id, new_sha, old_sha) in enumerate(commits):
-            local_image = image(repo_id, new_sha)
-            if not self.config.dockerhub_force and local_image in self.config.dockerhub_containers:
-                continue
-            remote_image = f"{self.config.dockerhub_user}/{self.config.dockerhub_repo}:{local_image}"
-            if image_exists(repo_id, new_sha) and (not image_exists(other=remote_image) or self.config.dockerhub_force):
-                logging.info(f"Tagging {local_image} -> {remote_image}")
-                subprocess.run(["docker", "tag", local_image, remote_image], check=True)
-                logging.info(f"Pushing {remote_image} to Dockerhub")
-                subprocess.run(["docker", "push", remote_image], check=True)
+        local_images = self._select(commits)
+        if not self.config.dockerhub_force and self.config.check_dockerhub:
+            local_images = [i for i in local_images if i not in self.config.dockerhub_containers]
+        ImageTransfer(self.config).push(local_images, force=self.config.dockerhub_force)
 
     def pull(self) -> None:
         if self.config.input:
@@ -35,12 +31,21 @@ class DockerHubPipeline():
             logging.warning(f"Invalid input: {self.config.input}")
 
     def _pull_commits(self, commits: list[tuple[str, str, str]]) -> None:
-        for i, (repo_id, new_sha, old_sha) in enumerate(commits):
-            local_image = image(repo_id, new_sha)
-            remote_image = f"{self.config.dockerhub_user}/{self.config.dockerhub_repo}:{local_image}"
-            logging.info(f"Pulling {remote_image} from Dockerhub")
-            subprocess.run(["docker", "pull", remote_image], check=True)
-            subprocess.run(["docker", "tag", remote_image, local_image], check=True)
-            
-            
-            
+        ImageTransfer(self.config).pull(self._select(commits))
+
+    def _select(self, commits: list[tuple[str, str, str]]) -> list[str]:
+        """Image names of the commits, restricted to the --only subset."""
+        local_images = list(dict.fromkeys(image(repo_id, new_sha) for repo_id, new_sha, _ in commits))
+        if not self.config.only:
+            return local_images
+
+        if Path(self.config.only).exists():
+            subset = CommitHandler(self.config.only, self.config.storage_paths['clones']).get_commits()
+            names = {image(repo_id, new_sha) for repo_id, new_sha, _ in subset}
+            selected = [i for i in local_images if i in names]
+        else:
+            patterns = [p.strip() for p in self.config.only.split(",") if p.strip()]
+            selected = [i for i in local_images if any(fnmatch.fnmatch(i, p.lower()) for p in patterns)]
+
+        logging.info(f"Selected {len(selected)} of {len(local_images)} images with --only {self.config.only}")
+        return selected
@@ -7,6 +7,7 @@ from src.gh.collector import RepositoryCollector
 from src.core.filter.structure_filter import StructureFilter
 from src.core.filter.process_filter import ProcessFilter
 from src.utils.writer import Writer
+from src.core.docker.pool import ContainerPool
 
 class RepositoryPipeline:
     """
@@ -33,6 +34,7 @@ class RepositoryPipeline:
             return
 
         logging.info(f"Found {len(repo_ids)} repositories.")
+        ContainerPool(self.config).warm()
         structure = StructureFilter(self.config)
         process = ProcessFilter(self.config)
         for repo_id in tqdm(repo_ids, total=len(repo_ids), desc=f"Testing repositories...", mininterval=5):
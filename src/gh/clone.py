@@ -13,7 +13,7 @@ class GitHandler:
                 return line.split()[1].split("/")[-1]
         return "main" 
 
-    def clone_repo(self, repo_id: str, repo_path: Path, branch: str = "main", sha: str = "") -> bool:
+    def clone_repo(self, repo_id: str, repo_path: Path, branch: str = "main", sha: str = "", chmod: bool = True) -> bool:
         url = f"https://github.com/{repo_id}.git"
         
         if os.path.exists(repo_path):
@@ -61,7 +61,8 @@ class GitHandler:
                     check=True
                 )
                 """
-                self.set_permission(str(repo_path))
+                if chmod:
+                    self.set_permission(str(repo_path))
                 logging.info(f"Repository checked out to commit {sha} successfully")
                 return True
                 
@@ -86,7 +87,8 @@ class GitHandler:
                 cwd=repo_path,
                 check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
             )
-            self.set_permission(str(repo_path))
+            if chmod:
+                self.set_permission(str(repo_path))
             logging.info(f"Repository cloned successfully")
             return True
         except subprocess.CalledProcessError as e:
@@ -92,6 +92,9 @@ def setup_parser() -> argparse.ArgumentParser:
                               help="Checks if the image is already uploaded to dockerhub. Used in --pushimages")
     docker_group.add_argument("--noimage", action="store_true",
                               help="Does not save the docker image for testcommits")
+    docker_group.add_argument("--only", type=str,
+                              help="Only pushes/pulls a subset of the images in --pushimages and --pullimages: " \
+                              "a folder of json files (e.g. data/significant/), a commits file or image name patterns (e.g. 'fmtlib_fmt_*').")
     return parser
 
 
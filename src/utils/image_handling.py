@@ -1,30 +1,187 @@
-import os, requests, docker, logging
+import os, requests, docker, logging, threading, json, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Iterator, BinaryIO
+
+try:
+    import zstandard
+except ImportError: # optional, images are then exported as uncompressed tar files
+    zstandard = None
+
+ARCHIVE_CHUNK_SIZE = 2 << 20
+
+# one Docker client and one snapshot of the local image tags per process
+_client: Optional[docker.DockerClient] = None
+_client_pid: int = -1
+_image_tags: Optional[set[str]] = None
+_image_lock = threading.Lock()
+
+def _reset_image_lock() -> None:
+    global _image_lock
+    _image_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_image_lock)
 
 def image(repo_id: str, sha: str) -> str:
     return ("_".join(repo_id.split("/")) + f"_{sha}").lower()
 
+def _tag_name(image_name: str) -> str:
+    """Normalizes an image reference to 'repository:tag' as listed by the docker daemon."""
+    if "@" in image_name or ":" in image_name.rsplit("/", 1)[-1]:
+        return image_name
+    return f"{image_name}:latest"
+
+def docker_client() -> docker.DockerClient:
+    """Returns the process-wide Docker client (recreated after a fork)."""
+    global _client, _client_pid, _image_tags
+    with _image_lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = docker.from_env()
+            _client_pid = os.getpid()
+            _image_tags = None
+        return _client
+
+def refresh_image_index() -> set[str]:
+    """Snapshots all local image tags from the docker daemon."""
+    global _image_tags
+    client = docker_client()
+    tags: set[str] = set()
+    try:
+        for img in client.images.list():
+            tags.update(img.tags)
+    except docker.errors.APIError as e: #type:ignore
+        logging.warning(f"Failed to list docker images: {e}")
+    with _image_lock:
+        _image_tags = tags
+    return tags
+
+def _image_index() -> set[str]:
+    docker_client()
+    if _image_tags is None:
+        return refresh_image_index()
+    return _image_tags
+
+def register_image(image_name: str) -> None:
+    """Adds an image tag created by commit/tag/pull/load to the local image index."""
+    index = _image_index()
+    with _image_lock:
+        index.add(_tag_name(image_name))
+
+def unregister_image(image_name: str) -> None:
+    """Removes a deleted image tag from the local image index."""
+    index = _image_index()
+    with _image_lock:
+        index.discard(_tag_name(image_name))
+
 def image_exists(repo_id: str = "", sha: str = "", other: str = "") -> bool:
+    """
+    Checks the local image index first, on a miss asks the docker daemon (the image may have
+    been created by another worker, or <other> is an image ID or digest).
+    """
     image_name = other if other else image(repo_id, sha)
-    client = docker.from_env()
-    try:
-        client.images.get(image_name)
+    if _tag_name(image_name) in _image_index():
         return True
+    try:
+        docker_client().images.get(image_name)
     except docker.errors.ImageNotFound: #type:ignore
         return False
-    except docker.errors.APIError: #type:ignore
+    except docker.errors.APIError as e: #type:ignore
+        logging.warning(f"Failed to inspect image '{image_name}': {e}")
         return False
+    register_image(image_name)
+    return True
+    
+def image_size(image_name: str) -> int:
+    """Size of a local image in bytes, 0 if it does not exist."""
+    try:
+        return docker_client().images.get(image_name).attrs.get("Size", 0)
+    except docker.errors.APIError as e: #type:ignore
+        logging.warning(f"Failed to inspect image '{image_name}': {e}")
+        return 0
     
 def delete_image(repo_id: str = "", sha: str = "", other: str = "") -> None:
     image_name = other if other else image(repo_id, sha)
-    client = docker.from_env()
+    client = docker_client()
     try:
         client.images.remove(image=image_name, force=True)
+        unregister_image(image_name)
         logging.info(f"Image '{image_name}' has been deleted.")
     except docker.errors.ImageNotFound: #type:ignore
+        unregister_image(image_name)
         logging.info(f"Image '{image_name}' not found.")
     except docker.errors.APIError as e: #type:ignore
         logging.info(f"Failed to delete image: {e}")
 
+def _log_archive(action: str, path: Path, image_bytes: int, file_bytes: int, seconds: float) -> dict:
+    stats = {
+        "image_bytes": image_bytes,
+        "file_bytes": file_bytes,
+        "ratio": image_bytes / file_bytes if file_bytes else 0.0,
+        "seconds": seconds,
+        "mib_per_s": image_bytes / (1 << 20) / seconds if seconds > 0 else 0.0,
+    }
+    logging.info(
+        f"{action} {path}: {image_bytes / (1 << 20):.1f} MiB image, {file_bytes / (1 << 20):.1f} MiB file "
+        f"(ratio {stats['ratio']:.2f}), {seconds:.1f}s ({stats['mib_per_s']:.1f} MiB/s)"
+    )
+    return stats
+
+def save_image(image_name: str, path: Path, compression: str = "", level: int = 3) -> Optional[dict]:
+    """
+    Streams an image into a tar archive (<path>.tar, or <path>.tar.zst with zstd compression),
+    chunk by chunk so that the memory use does not depend on the image size. Returns the
+    size/ratio/throughput statistics, None on failure.
+    """
+    if compression == "zstd" and zstandard is None:
+        logging.warning("zstandard is not installed, saving an uncompressed tar file")
+        compression = ""
+    path = Path(f"{path}.tar.zst" if compression == "zstd" else f"{path}.tar")
+
+    start = time.perf_counter()
+    image_bytes = 0
+    try:
+        chunks = docker_client().images.get(image_name).save(chunk_size=ARCHIVE_CHUNK_SIZE, named=True)
+        with open(path, "wb") as f:
+            if compression == "zstd":
+                with zstandard.ZstdCompressor(level=level, threads=-1).stream_writer(f, closefd=False) as writer: # type: ignore
+                    for chunk in chunks:
+                        writer.write(chunk)
+                        image_bytes += len(chunk)
+            else:
+                for chunk in chunks:
+                    f.write(chunk)
+                    image_bytes += len(chunk)
+    except (docker.errors.APIError, OSError) as e: #type:ignore
+        logging.error(f"Saving image '{image_name}' to {path} failed: {e}")
+        return None
+    return _log_archive("Saved", path, image_bytes, path.stat().st_size, time.perf_counter() - start)
+
+def _read_chunks(f: BinaryIO, counter: list[int]) -> Iterator[bytes]:
+    while chunk := f.read(ARCHIVE_CHUNK_SIZE):
+        counter[0] += len(chunk)
+        yield chunk
+
+def load_image(path: Path) -> list[str]:
+    """Streams a (zstd compressed) image tar archive into the docker daemon, returns the loaded tags."""
+    path = Path(path)
+    start = time.perf_counter()
+    image_bytes = [0]
+    with open(path, "rb") as f:
+        if path.suffix == ".zst":
+            if zstandard is None:
+                raise RuntimeError(f"zstandard is required to load {path}")
+            reader = zstandard.ZstdDecompressor().stream_reader(f, read_size=ARCHIVE_CHUNK_SIZE)
+        else:
+            reader = f
+        # a generator is sent with chunked transfer encoding, nothing is read into memory as a whole
+        images = docker_client().images.load(_read_chunks(reader, image_bytes))
+
+    tags = [tag for img in images for tag in img.tags]
+    for tag in tags:
+        register_image(tag)
+    _log_archive("Loaded", path, image_bytes[0], path.stat().st_size, time.perf_counter() - start)
+    return tags
+
 def check_dockerhub() -> tuple[str, str]:
     dockerhub_user = os.environ.get("DOCKER_HUB_USER", "")
     dockerhub_repo = os.environ.get("DOCKER_HUB_REPO", "")
@@ -35,21 +192,73 @@ def check_dockerhub() -> tuple[str, str]:
     return dockerhub_user, dockerhub_repo
 
 
-def dockerhub_containers(dockerhub_user: str, dockerhub_repo: str) -> list[str]:
-    tags = []
-    url = f"https://hub.docker.com/v2/repositories/{dockerhub_user}/{dockerhub_repo}/tags?page_size=100"
+DOCKERHUB_PAGE_SIZE = 100
+DOCKERHUB_FULL_REFRESH = 7 * 24 * 3600 # in seconds, also drops tags deleted on Dockerhub
 
-    while url:
-        resp = requests.get(url)
-        resp.raise_for_status()
-        data = resp.json()
+def _dockerhub_page(session: requests.Session, url: str, page: int) -> dict:
+    resp = session.get(url, params={"page_size": DOCKERHUB_PAGE_SIZE, "page": page, "ordering": "last_updated"}, timeout=30)
+    resp.raise_for_status()
+    return resp.json()
 
-        for r in data["results"]:
-            tags.append(r["name"])
+def dockerhub_containers(dockerhub_user: str, dockerhub_repo: str, cache_path: Optional[Path] = None, ttl: int = 0, workers: int = 8) -> list[str]:
+    """
+    Returns the tags of dockerhub_user/dockerhub_repo, newest first.
 
-        url = data["next"]  # None when no more pages
+    With a <cache_path> the tag inventory is persisted: within <ttl> seconds it is used as is,
+    afterwards it is refreshed incrementally (newest tags first until a known tag). A full
+    refresh (no or an old inventory) fetches all pages concurrently.
+    """
+    url = f"https://hub.docker.com/v2/repositories/{dockerhub_user}/{dockerhub_repo}/tags"
+    key = f"{dockerhub_user}/{dockerhub_repo}"
+    now = time.time()
 
-    return tags
+    inventories: dict[str, dict] = {}
+    if cache_path:
+        try:
+            with open(cache_path) as f:
+                inventories = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            inventories = {}
+    inventory = inventories.get(key)
+
+    if inventory and now - inventory["fetched"] < ttl:
+        return list(inventory["tags"])
+
+    with requests.Session() as session:
+        if inventory and now - inventory["full"] < DOCKERHUB_FULL_REFRESH:
+            tags: dict[str, str] = {}
+            newest = max(inventory["tags"].values(), default="")
+            page, data = 1, {"next": True}
+            while data["next"]:
+                data = _dockerhub_page(session, url, page)
+                results = data["results"]
+                tags.update((r["name"], r["last_updated"] or "") for r in results)
+                if any(r["name"] in inventory["tags"] and (r["last_updated"] or "") <= newest for r in results):
+                    break
+                page += 1
+            logging.info(f"Refreshed {len(tags)} new or updated Dockerhub tags of {key}")
+            tags.update((name, updated) for name, updated in inventory["tags"].items() if name not in tags)
+            full = inventory["full"]
+        else:
+            first = _dockerhub_page(session, url, 1)
+            pages = -(-first["count"] // DOCKERHUB_PAGE_SIZE)
+            results = list(first["results"])
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for data in executor.map(lambda page: _dockerhub_page(session, url, page), range(2, pages + 1)):
+                    results += data["results"]
+            tags = {r["name"]: r["last_updated"] or "" for r in results}
+            logging.info(f"Fetched {len(tags)} Dockerhub tags of {key} ({pages} pages)")
+            full = now
+
+    tags = dict(sorted(tags.items(), key=lambda t: t[1], reverse=True))
+    if cache_path:
+        inventories[key] = {"fetched": now, "full": full, "tags": tags}
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(inventories, f, indent=4)
+        tmp_path.replace(cache_path)
+    return list(tags)
 
 def config_image(config, repo_id: str, new_sha: str) -> bool:
     """Configure the docker image depending on flags (check, delete)."""
@@ -0,0 +1,30 @@
+import fcntl, os, threading
+from pathlib import Path
+
+class FileLock:
+    """Inter-process lock (fcntl), also serializes the threads of one process."""
+    _thread_lock = threading.Lock()
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, "a")
+        fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.file:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+        self._thread_lock.release()
+
+def _reset_thread_lock() -> None:
+    # a background thread may hold the lock while ProcessPoolExecutor forks a worker
+    FileLock._thread_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_reset_thread_lock)
@@ -153,3 +153,11 @@ def remove_exclude_from_all(repo_root: Path) -> None:
 
         if modified != original:
             cmake_file.write_text(modified, encoding="utf-8")
+
+def parse_mem(mem: str) -> int:
+    """Parses a docker memory string ('512m', '2g', ...) into bytes."""
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([bkmg]?)b?\s*", str(mem).lower())
+    if not m:
+        raise ValueError(f"Invalid memory size: {mem}")
+    factor = {"": 1, "b": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30}[m.group(2)]
+    return int(float(m.group(1)) * factor)
@@ -7,6 +7,10 @@ from github.Repository import Repository
 from github.Issue import Issue
 from src.core.filter.commit_filter import CommitFilter
 from src.config.config import Config
+from src.utils.parser import parse_mem
+
+# a run whose memory peak reaches this fraction of mem_limit is considered to be under memory pressure
+NOISY_MEMORY_FRACTION = 0.9
 
 def safe_float(x):
     if x is None or (isinstance(x, float) and math.isnan(x)):
@@ -183,7 +187,8 @@ class TestAnalyzer:
     def create_test_log(self, commit: Commit, repo: Repository, old_sha: str, new_sha: str,
                         old_full_times: list[float], new_full_times: list[float],
                         new_build_cmd: list[str], old_build_cmd: list[str], 
-                        new_test_cmd: list[str], old_test_cmd: list[str],) -> dict:
+                        new_test_cmd: list[str], old_test_cmd: list[str],
+                        old_run_stats: list[dict] = [], new_run_stats: list[dict] = []) -> dict:
         
         gh_refs: list[tuple[str, int, str, str, Issue]] = []
         messages: list[str] = []
@@ -264,7 +269,11 @@ class TestAnalyzer:
             "old_ci99_ms": self.ci99(old_full_times[self.warmup:]),
             "new_ci99_ms": self.ci99(new_full_times[self.warmup:]),
             "new_times_s": new_full_times,
-            "old_times_s": old_full_times
+            "old_times_s": old_full_times,
+            "new_run_stats": new_run_stats,
+            "old_run_stats": old_run_stats,
+            "new_noisy_runs": self.noisy_runs(new_run_stats),
+            "old_noisy_runs": self.noisy_runs(old_run_stats)
         }
 
         significant_test_time_changes = self.get_significant_test_time_changes(self.get_improvement_p_value)
@@ -471,4 +480,21 @@ class TestAnalyzer:
         mean = np.mean(arr)
 
         # return in milliseconds
-        return (float((mean - h) * 1000), float((mean + h) * 1000))
\ No newline at end of file
+        return (float((mean - h) * 1000), float((mean + h) * 1000))
+
+    def noisy_runs(self, run_stats: list[dict]) -> list[int]:
+        """
+        Indices of the runs (including warmup) whose timing was likely distorted by the container limits:
+        CFS throttling under cpu_quota, hitting memory.max/OOM kills, major page faults
+        or a memory peak near mem_limit.
+        """
+        mem_limit = parse_mem(self.config.resources.mem_limit)
+        noisy: list[int] = []
+        for i, run in enumerate(run_stats):
+            if (run.get("nr_throttled", 0) > 0 or
+                run.get("memory_max_events", 0) > 0 or
+                run.get("oom_kill", 0) > 0 or
+                run.get("majflt", 0) > 0 or
+                (run.get("memory_peak_reset") and mem_limit and run.get("memory_peak", 0) >= NOISY_MEMORY_FRACTION * mem_limit)):
+                noisy.append(i)
+        return noisy
\ No newline at end of file
@@ -1,6 +1,16 @@
-import json, subprocess
+import json, subprocess, threading, time, docker
 from pathlib import Path
+from types import SimpleNamespace
+from src.utils import image_handling
 from src.utils.image_handling import image
+from src.cmake.process import CMakeProcess
+from src.cmake.resolver import DependencyResolver
+from src.cmake.depstore import DependencyStore
+from src.config import settings
+from src.core.docker import pool
+from src.core.docker.pool import ContainerPool, POOL_LABEL
+from src.core.docker.manager import DockerManager, RELOCATE_SCRIPT, RPATH_SCRIPT, DEDUPE_SCRIPT, _LOG_FILES
+from src.config.constants import CMAKE_RELOCATABLE_FLAGS
 
 PYTHON_EXEC = "python3"
 
@@ -152,6 +162,224 @@ def test_docker():
 
     
 
+def test_record_ctest_stats():
+    process = CMakeProcess.__new__(CMakeProcess)
+    process.test_path = Path("/test_workspace/workspace/new/build")
+    process.test_time = {"parsed": [0.0, 0.0], "time": [0.0, 0.0]}
+    process.run_stats = [{}, {}]
+    process.ctest_output = []
+    process.per_test_times = {}
+    stdout = (
+        "1/1 Test #1: unit_tests .......................   Passed    0.42 sec\n\n"
+        "100% tests passed, 0 tests failed out of 1\n\n"
+        "Total Test time (real) =   0.43 sec\n"
+    )
+    stats = {"cpu_usage_usec": 412000.0, "cgroup_pgfault": 1200.0, "memory_peak": 52428800, "memory_peak_reset": True}
+
+    assert process.record_test(["ctest", "--output-on-failure"], False, 0, stdout, 0.5, stats)
+    assert process.test_time == {"parsed": [0.43, 0.0], "time": [0.5, 0.0]}
+    assert process.run_stats[0] == stats
+    assert process.run_stats[1] == {}
+    print("TEST (record_test) SUCCESSFUL")
+
+def test_fallback_generator():
+    process = CMakeProcess.__new__(CMakeProcess)
+    process.generator = "Ninja"
+    process.config_stdout, process.build_stdout, process.build_stderr = "", "", ""
+    process.config_stderr = (
+        "CMake Error at /usr/share/cmake-3.22/Modules/FindPackageHandleStandardArgs.cmake:230 (message):\n"
+        "  Could NOT find ZLIB (missing: ZLIB_LIBRARY ZLIB_INCLUDE_DIR)\n"
+    )
+    assert not process._fallback_generator()
+    assert process.generator == "Ninja"
+
+    process.config_stderr = (
+        "CMake Error: CMake was unable to find a build program corresponding to \"Ninja\".  "
+        "CMAKE_MAKE_PROGRAM is not set.  You probably need to select a different build tool.\n"
+    )
+    assert process._fallback_generator()
+    assert process.generator == ""
+    assert not process._fallback_generator()
+    print("TEST (_fallback_generator) SUCCESSFUL")
+
+def test_pkgconfig_missing():
+    error = (
+        "CMake Error at /usr/share/cmake-3.22/Modules/FindPkgConfig.cmake:603 (message):\n"
+        "  The following required packages were not found:\n"
+        "\n"
+        "   - gio-unix-2.0\n"
+        "   - libsoup-2.4\n"
+        "\n"
+    )
+    call_stack = (
+        "Call Stack (most recent call first):\n"
+        "  /usr/share/cmake-3.22/Modules/FindPkgConfig.cmake:825 (_pkg_check_modules_internal)\n"
+        "  CMakeLists.txt:12 (pkg_check_modules)\n"
+        "\n"
+        "\n"
+    )
+    status = "-- Configuring incomplete, errors occurred!\n"
+    handler = DependencyResolver.PackageHandler()
+    assert handler._find_pkgconfig_missing("", error + call_stack + status) == {"gio-unix-2.0", "libsoup-2.4"}
+    # stdout and stderr in one stream: the status line directly follows the list
+    assert handler._find_pkgconfig_missing(error + status, "") == {"gio-unix-2.0", "libsoup-2.4"}
+    print("TEST (_find_pkgconfig_missing) SUCCESSFUL")
+
+class ExecContainer:
+    def __init__(self, id: str, labels: dict[str, str]):
+        self.id = id
+        self.name = id
+        self.labels = labels
+        self.commands: list[list[str]] = []
+
+    def exec_run(self, cmd: list[str]):
+        self.commands.append(cmd)
+        return 0, b""
+
+    def rename(self, name: str):
+        self.name = name
+
+def test_pool_apt_update(tmp_path: Path, monkeypatch):
+    # the resolver and the pool only read these settings, no GitHub setup
+    config = SimpleNamespace(
+        testing=settings.TestingSettings(), resources=settings.ResourceSettings(pool_size=1),
+        docker_map={"22.04": "cpp22"}, storage_paths={"docker-pool": tmp_path / "docker-pool.lock"},
+    )
+    resolver = DependencyResolver(config, cache=DependencyStore(tmp_path / "cmake-dep.sqlite"), llm=object()) # type: ignore
+
+    idle = ExecContainer("pooled", {POOL_LABEL: "cpp22"})
+    container_pool = ContainerPool(config) # type: ignore
+    monkeypatch.setattr(container_pool, "_idle", lambda docker_image: [idle])
+    monkeypatch.setattr(container_pool, "refill", lambda docker_image, background: None)
+    monkeypatch.setattr(pool, "docker_client", lambda: SimpleNamespace(containers=SimpleNamespace(get=lambda id: idle)))
+    resolver.container = container_pool.acquire("cpp22", "commit")
+    assert resolver.container is idle and idle.name == "commit"
+    assert not resolver.install_packages(["zlib1g-dev"])
+    assert idle.commands == [["apt-get", "install", "-y", "zlib1g-dev"]]
+
+    # a container of an image committed from a pool container carries the pool labels, but was not warmed up
+    started = ExecContainer("started", {POOL_LABEL: "cpp22"})
+    resolver.container = started
+    assert not resolver.install_packages(["zlib1g-dev"])
+    assert started.commands == [["apt-get", "update"], ["apt-get", "install", "-y", "zlib1g-dev"]]
+    print("TEST (_apt_update) SUCCESSFUL")
+
+def test_pool_drain(tmp_path: Path, monkeypatch):
+    config = SimpleNamespace(
+        testing=settings.TestingSettings(), resources=settings.ResourceSettings(pool_size=1),
+        docker_map={"22.04": "cpp22"}, storage_paths={"docker-pool": tmp_path / "docker-pool.lock"},
+    )
+    monkeypatch.setattr(pool, "_STOPPING", threading.Event())
+    monkeypatch.setattr(pool, "_REFILLS", [])
+    created: list[ExecContainer] = []
+    removed: list[ExecContainer] = []
+
+    def create(docker_image: str):
+        time.sleep(0.2) # the refill is still creating its container when drain starts
+        created.append(ExecContainer(f"{pool.WARMING_PREFIX}{docker_image}", {POOL_LABEL: docker_image}))
+        return created[-1]
+
+    def warm_up(container: ExecContainer) -> bool:
+        container.rename(container.name.replace(pool.WARMING_PREFIX, pool.IDLE_PREFIX, 1))
+        return True
+
+    container_pool = ContainerPool(config) # type: ignore
+    monkeypatch.setattr(container_pool, "_expire", lambda: None)
+    monkeypatch.setattr(container_pool, "_pooled", lambda: [c for c in created if c not in removed])
+    monkeypatch.setattr(container_pool, "_create", create)
+    monkeypatch.setattr(container_pool, "_warm_up", warm_up)
+    monkeypatch.setattr(ExecContainer, "remove", lambda self, force: removed.append(self), raising=False)
+    monkeypatch.setattr(pool, "docker_client", lambda: SimpleNamespace(containers=SimpleNamespace(list=lambda all, filters: [c for c in created if c not in removed])))
+
+    container_pool.refill("cpp22", background=True)
+    container_pool.drain()
+    assert len(created) == 1 and removed == created
+    container_pool.refill("cpp22", background=True)
+    assert not pool._REFILLS and len(created) == 1
+    print("TEST (ContainerPool.drain) SUCCESSFUL")
+
+def test_relocate_tree(tmp_path: Path):
+    # build_from: the old commit is built in the new commit's tree, which is moved to the old path and restored
+    old, new = tmp_path / "old", tmp_path / "new"
+    new.mkdir()
+    (new / "CMakeLists.txt").write_text(
+        "cmake_minimum_required(VERSION 3.14)\nproject(relocate CXX)\n"
+        "add_library(value SHARED value.cpp)\nadd_executable(main main.cpp)\ntarget_link_libraries(main value)\n"
+    )
+    (new / "value.cpp").write_text("int value() { return 0; }\n")
+    (new / "main.cpp").write_text("int value();\nint main() { return value(); }\n")
+    build = new / "build"
+    subprocess.run(["cmake", "-S", str(new), "-B", str(build)] + CMAKE_RELOCATABLE_FLAGS, check=True, capture_output=True)
+    subprocess.run(["cmake", "--build", str(build)], check=True, capture_output=True)
+    (build / "data").mkdir()
+    (build / "data" / "input.txt").write_text(f"{new}/data\n")
+    pinned = subprocess.run(["sh", "-c", RPATH_SCRIPT, "rpath", str(new), str(build)], check=True, capture_output=True, text=True)
+    assert pinned.stdout == ""
+
+    new.rename(old)
+    subprocess.run(["sh", "-c", RELOCATE_SCRIPT, "relocate", str(new), str(old), str(old / "build")], check=True)
+    # the restored new tree with a library the old binary must not load
+    (new / "build").mkdir(parents=True)
+    subprocess.run(["c++", "-shared", "-fPIC", "-o", str(new / "build" / "libvalue.so"), "-x", "c++", "-"], input=b"int value() { return 1; }\n", check=True)
+
+    runpath = subprocess.run(["readelf", "-d", str(old / "build" / "main")], check=True, capture_output=True, text=True).stdout
+    assert "$ORIGIN" in runpath and str(new) not in runpath
+    assert subprocess.run([str(old / "build" / "main")]).returncode == 0
+    assert f"CMAKE_HOME_DIRECTORY:INTERNAL={old}\n" in (old / "build" / "CMakeCache.txt").read_text()
+    assert (old / "build" / "data" / "input.txt").read_text() == f"{new}/data\n"
+    print("TEST (RELOCATE_SCRIPT) SUCCESSFUL")
+
+def test_image_exists(monkeypatch):
+    # an image missing in the per-process tag snapshot (created by another worker, or an image ID) is looked up in the daemon
+    class Images:
+        def get(self, name: str):
+            if name in ("other_worker:latest", "sha256:0123"):
+                return SimpleNamespace(tags=[name])
+            raise docker.errors.ImageNotFound(name) # type: ignore
+    monkeypatch.setattr(image_handling, "docker_client", lambda: SimpleNamespace(images=Images()))
+    monkeypatch.setattr(image_handling, "_image_tags", {"cpp20:latest"})
+
+    assert image_handling.image_exists(other="cpp20")
+    assert image_handling.image_exists(other="other_worker:latest")
+    assert "other_worker:latest" in image_handling._image_tags
+    assert image_handling.image_exists(other="sha256:0123")
+    assert not image_handling.image_exists(other="missing")
+    print("TEST (image_exists) SUCCESSFUL")
+
+def test_host_logs(tmp_path: Path):
+    # the host logs of a rerun commit start empty and are removed when the container stops
+    config = SimpleNamespace(storage_paths={"docker-logs": str(tmp_path)})
+    log_dir = tmp_path / "container"
+    log_dir.mkdir()
+    (log_dir / "new.log").write_text("stale run\n")
+    docker = DockerManager(config, tmp_path, "cpp20", "/test", new=True) # type: ignore
+    docker.container_name = "container"
+    docker.write_log("first\n")
+    docker.write_log("second\n")
+    _LOG_FILES[log_dir / "new.log"].flush()
+    assert (log_dir / "new.log").read_text() == "first\nsecond\n"
+    docker.close_logs()
+    assert not log_dir.exists() and not _LOG_FILES
+    print("TEST (host logs) SUCCESSFUL")
+
+def test_dedupe_trees(tmp_path: Path):
+    files = ["src/main.cpp", "build/_deps/fmt-src/include/fmt/core.h", "build/tests/data/input.txt"]
+    for tree in ("old", "new"):
+        for f in files:
+            (tmp_path / tree / f).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / tree / f).write_text(f"{f}\n")
+
+    result = subprocess.run(
+        ["sh", "-c", DEDUPE_SCRIPT, "dedupe", str(tmp_path / "old"), str(tmp_path / "new"), "build"],
+        capture_output=True, text=True, check=True
+    )
+    assert result.stdout.split() == ["2", str(len(files[0]) + len(files[1]) + 2)]
+    assert (tmp_path / "new" / files[0]).samefile(tmp_path / "old" / files[0])
+    assert (tmp_path / "new" / files[1]).samefile(tmp_path / "old" / files[1])
+    # test data in the build directory may be rewritten in place by a test
+    assert not (tmp_path / "new" / files[2]).samefile(tmp_path / "old" / files[2])
+    print("TEST (DEDUPE_SCRIPT) SUCCESSFUL")
+
 def test_llm():
     assert False
     